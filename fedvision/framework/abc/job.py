@@ -16,6 +16,7 @@ import abc
 from typing import List
 
 from fedvision.framework.protobuf import job_pb2, coordinator_pb2
+from fedvision.framework.utils.tracing import JobTracer
 
 
 class Job(metaclass=abc.ABCMeta):
@@ -24,6 +25,10 @@ class Job(metaclass=abc.ABCMeta):
 
     def __init__(self, job_id: str):
         self.job_id = job_id
+        # jobs with higher priority are admitted and served resources first
+        self.priority = 0
+        # spans of job lifecycle, under job's log directory
+        self.tracer = JobTracer(job_id)
 
     @property
     def resource_required(self):
@@ -32,9 +37,23 @@ class Job(metaclass=abc.ABCMeta):
     def set_required_resource(self, response):
         ...
 
+    def task_resource(self, task_type: str) -> job_pb2.Resource:
+        """
+        cpu, memory and disk a task of `task_type` occupies on worker besides a task slot,
+        nothing by default
+        """
+        return job_pb2.Resource()
+
     async def compile(self):
         ...
 
+    async def prepare_tasks(self):
+        """
+        load what `generate_proposal_request` and `generate_local_tasks` need,
+        called after compile and resources set
+        """
+        ...
+
     @abc.abstractmethod
     def generate_proposal_request(self) -> coordinator_pb2.Proposal.REQ:
         ...
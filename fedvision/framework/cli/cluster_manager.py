@@ -19,7 +19,14 @@ import click
 
 @click.command(name="start-manager")
 @click.option("--port", type=int, required=True, help="cluster manager address")
-def start_manager(port):
+@click.option(
+    "--dispatch-policy",
+    type=click.Choice(["spread", "best_fit", "two_choices"]),
+    default="spread",
+    help="spread: most free slots, best_fit: fewest free slots, "
+    "two_choices: more free slots of two random workers",
+)
+def start_manager(port, dispatch_policy):
     """
     start manager
     """
@@ -31,6 +38,7 @@ def start_manager(port):
     loop = asyncio.get_event_loop()
     manager = ClusterManager(
         port=port,
+        dispatch_policy=dispatch_policy,
     )
     try:
         loop.run_until_complete(manager.start())
@@ -32,6 +32,24 @@ import click
     required=False,
     help="data base dir",
 )
+@click.option(
+    "--cpu-cores",
+    type=float,
+    default=None,
+    help="cpu cores shared by tasks, 0 for not limited, default to cores of host",
+)
+@click.option(
+    "--memory",
+    type=str,
+    default=None,
+    help="memory shared by tasks, e.g. 16G, 0 for not limited, default to memory of host",
+)
+@click.option(
+    "--disk",
+    type=str,
+    default=None,
+    help="disk shared by tasks, e.g. 100G, 0 for not limited, default to free disk of data base dir",
+)
 def start_worker(
     name,
     worker_ip,
@@ -40,6 +58,9 @@ def start_worker(
     port_start,
     port_end,
     data_base_dir,
+    cpu_cores,
+    memory,
+    disk,
 ):
     """
     start worker
@@ -48,6 +69,11 @@ def start_worker(
 
     logger.set_logger(f"worker-{worker_ip}")
     from fedvision.framework.cluster.worker import ClusterWorker
+    from fedvision.framework.utils.resource import detect_resources, parse_size
+
+    detected_cpu_cores, detected_memory, detected_disk = detect_resources(
+        data_base_dir or "."
+    )
 
     loop = asyncio.get_event_loop()
     worker = ClusterWorker(
@@ -58,6 +84,9 @@ def start_worker(
         port_start=port_start,
         port_end=port_end,
         data_dir=data_base_dir,
+        cpu_cores=detected_cpu_cores if cpu_cores is None else cpu_cores,
+        memory_bytes=detected_memory if memory is None else parse_size(memory),
+        disk_bytes=detected_disk if disk is None else parse_size(disk),
     )
     try:
         loop.run_until_complete(worker.start())
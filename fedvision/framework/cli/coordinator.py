@@ -19,7 +19,49 @@ import click
 
 @click.command()
 @click.option("-p", "--port", type=int, required=True, help="port")
-def start_coordinator(port):
+@click.option(
+    "--proposal-retention",
+    type=float,
+    default=60,
+    show_default=True,
+    help="seconds to keep proposals after open period finished",
+)
+@click.option(
+    "--party-heartbeat-timeout",
+    type=float,
+    default=30,
+    show_default=True,
+    help="seconds without heartbeat before a party is evicted",
+)
+@click.option(
+    "--selection-policy",
+    type=click.Choice(["uniform", "capacity_weighted", "fastest"]),
+    default="uniform",
+    show_default=True,
+    help="default policy to choose participants from responders",
+)
+@click.option(
+    "--oversubscription",
+    type=float,
+    default=2.0,
+    show_default=True,
+    help="responders awaited per accepted party before closing open period early, "
+    "for selection policies other than uniform",
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    required=False,
+    help="port to serve prometheus metrics at /metrics, disabled if not set",
+)
+def start_coordinator(
+    port,
+    proposal_retention,
+    party_heartbeat_timeout,
+    selection_policy,
+    oversubscription,
+    metrics_port,
+):
     """
     start coordinator
     """
@@ -29,7 +71,14 @@ def start_coordinator(port):
     from fedvision.framework.coordinator.coordinator import Coordinator
 
     loop = asyncio.get_event_loop()
-    coordinator = Coordinator(port)
+    coordinator = Coordinator(
+        port,
+        proposal_retention=proposal_retention,
+        party_heartbeat_timeout=party_heartbeat_timeout,
+        selection_policy=selection_policy,
+        metrics_port=metrics_port,
+        oversubscription=oversubscription,
+    )
     try:
         loop.run_until_complete(coordinator.start())
         click.echo(f"coordinator server start at port:{port}")
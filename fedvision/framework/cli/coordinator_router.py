@@ -0,0 +1,52 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import click
+
+
+@click.command()
+@click.option("-p", "--port", type=int, required=True, help="port")
+@click.option(
+    "--shards",
+    type=str,
+    required=True,
+    help="comma separated addresses of coordinator shards",
+)
+def start_coordinator_router(port, shards):
+    """
+    start coordinator router
+    """
+    from fedvision.framework.utils import logger
+
+    logger.set_logger("coordinator_router")
+    from fedvision.framework.coordinator.router import CoordinatorRouter
+
+    loop = asyncio.get_event_loop()
+    router = CoordinatorRouter(port, shard_addresses=shards.split(","))
+    try:
+        loop.run_until_complete(router.start())
+        click.echo(f"coordinator router start at port:{port}")
+        loop.run_forever()
+    except KeyboardInterrupt:
+        click.echo("keyboard interrupted")
+    finally:
+        loop.run_until_complete(router.stop())
+        click.echo(f"coordinator router stop")
+        loop.close()
+
+
+if __name__ == "__main__":
+    start_coordinator_router()
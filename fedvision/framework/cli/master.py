@@ -26,21 +26,106 @@ import click
 @click.option(
     "--coordinator-address", type=str, required=True, help="coordinator address"
 )
-def start_master(party_id, submitter_port, cluster_address, coordinator_address):
+@click.option(
+    "--job-store",
+    type=str,
+    default=None,
+    help="sqlite database path of job status, `memory` to disable persistence, "
+    "default to <data dir>/master/<party id>/jobs.sqlite",
+)
+@click.option(
+    "--job-retention",
+    type=float,
+    default=7 * 24 * 3600,
+    help="seconds finished jobs kept in job store",
+)
+@click.option(
+    "--max-pending-jobs",
+    type=int,
+    default=100,
+    help="submit rejected when this many jobs are waiting",
+)
+@click.option(
+    "--max-concurrent-jobs",
+    type=int,
+    default=4,
+    help="jobs compiling, acquiring resources or proposing at the same time",
+)
+@click.option(
+    "--max-concurrent-compiles",
+    type=int,
+    default=2,
+    help="jobs compiling at the same time",
+)
+@click.option(
+    "--resource-wait-timeout",
+    type=float,
+    default=3600,
+    help="seconds a job waits for cluster resources before failed",
+)
+@click.option(
+    "--task-submit-batch-size",
+    type=int,
+    default=64,
+    help="max tasks sent to cluster manager in one request",
+)
+@click.option(
+    "--task-submit-inflight",
+    type=int,
+    default=4,
+    help="max task submit requests to cluster manager in flight",
+)
+@click.option(
+    "--dataset-size",
+    type=int,
+    default=0,
+    help="local training samples advertised to coordinator, "
+    "weights capacity_weighted selection, 0 for unknown",
+)
+def start_master(
+    party_id,
+    submitter_port,
+    cluster_address,
+    coordinator_address,
+    job_store,
+    job_retention,
+    max_pending_jobs,
+    max_concurrent_jobs,
+    max_concurrent_compiles,
+    resource_wait_timeout,
+    task_submit_batch_size,
+    task_submit_inflight,
+    dataset_size,
+):
     """
     start master
     """
+    import os
+
+    from fedvision import get_data_dir
     from fedvision.framework.utils import logger
 
     logger.set_logger(f"master-{party_id}")
     from fedvision.framework.master.master import Master
 
+    if job_store is None:
+        job_store = os.path.join(get_data_dir(), "master", party_id, "jobs.sqlite")
+
     loop = asyncio.get_event_loop()
     master = Master(
         party_id=party_id,
         coordinator_address=coordinator_address,
         cluster_address=cluster_address,
         rest_port=submitter_port,
+        job_store=job_store,
+        job_retention=job_retention,
+        max_pending_jobs=max_pending_jobs,
+        max_concurrent_jobs=max_concurrent_jobs,
+        max_concurrent_compiles=max_concurrent_compiles,
+        resource_wait_timeout=resource_wait_timeout,
+        task_submit_batch_size=task_submit_batch_size,
+        task_submit_inflight=task_submit_inflight,
+        dataset_size=dataset_size,
     )
     try:
         loop.run_until_complete(master.start())
@@ -57,7 +57,13 @@ def post(endpoint, path, json_data):
     type=str,
     required=True,
 )
-def submit(endpoint, config):
+@click.option(
+    "--priority",
+    type=int,
+    default=0,
+    help="jobs with higher priority are admitted first",
+)
+def submit(endpoint, config, priority):
 
     base = Path(config)
     with base.open("r") as f:
@@ -78,6 +84,60 @@ def submit(endpoint, config):
             job_type=job_type,
             job_config=job_config,
             algorithm_config=algorithm_config_string,
+            priority=priority,
+        ),
+    )
+
+
+@cli.command()
+@click.option(
+    "--config",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    required=True,
+    help="submit config, with optional `sweep` mapping job config keys to lists of values, "
+    "`algorithm_config` may be a list of paths to sweep algorithm configs",
+)
+@click.option(
+    "--endpoint",
+    type=str,
+    required=True,
+)
+@click.option(
+    "--priority",
+    type=int,
+    default=0,
+    help="jobs with higher priority are admitted first",
+)
+def submit_batch(endpoint, config, priority):
+
+    base = Path(config)
+    with base.open("r") as f:
+        config_json = yaml.load(f, yaml.Loader)
+    job_type = config_json.get("job_type")
+    job_config = config_json.get("job_config")
+    sweep = config_json.get("sweep", {})
+    algorithm_config_paths = config_json.get("algorithm_config")
+    if not isinstance(algorithm_config_paths, list):
+        algorithm_config_paths = [algorithm_config_paths]
+    algorithm_config_strings = []
+    for path in algorithm_config_paths:
+        with base.parent.joinpath(path).absolute().open("r") as f:
+            algorithm_config_strings.append(f.read())
+
+    validator = extensions.get_job_schema_validator(job_type)
+    validator.validate(job_config)
+    for key, values in sweep.items():
+        for value in values:
+            validator.validate({**job_config, key: value})
+    post(
+        endpoint,
+        "submit_batch",
+        dict(
+            job_type=job_type,
+            job_config=job_config,
+            algorithm_config=algorithm_config_strings,
+            sweep=sweep,
+            priority=priority,
         ),
     )
 
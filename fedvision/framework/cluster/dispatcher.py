@@ -0,0 +1,196 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+capacity indexed worker selection of cluster manager.
+
+Workers with free task slots are bucketed by number of free slots, and the
+non-empty bucket levels are kept sorted, so a placement visits the bucket with
+most (spread) or fewest (best fit) free slots first instead of scanning every
+worker. Cost of a placement and of a capacity update depends on the number of
+distinct free slot levels (bounded by max tasks of a worker), not the number of
+workers. Random-of-two-choices samples from an array of workers with free slots.
+
+Within a bucket, workers are kept in the order they entered it, so equally
+loaded workers are taken round robin.
+
+For tasks requiring more than a slot (cpu, memory, disk), a `leftover` score
+(fraction of the scarcest capacity a worker would have left) is compared among
+the first `probes` qualified workers: spread takes the largest, best fit the
+smallest, so placement packs across all dimensions at bounded cost.
+"""
+
+import bisect
+import collections
+import random
+from typing import Callable, List, MutableMapping, Optional
+
+from fedvision.framework.utils.exception import FedvisionException
+
+SPREAD = "spread"
+BEST_FIT = "best_fit"
+TWO_CHOICES = "two_choices"
+POLICIES = (SPREAD, BEST_FIT, TWO_CHOICES)
+
+
+class WorkerIndex(object):
+    """
+    index of workers by free task slots, read from `worker.num_task_remind`.
+
+    `update` should be called after free slots of a worker changed.
+    """
+
+    def __init__(self, policy: str = SPREAD, seed=None, probes: int = 8):
+        """
+        Args:
+            policy: `spread` (most free slots), `best_fit` (fewest free slots)
+                or `two_choices` (more free slots of two random workers)
+            seed: seed of random choices
+            probes: qualified workers compared when selecting with `leftover`
+        """
+        if policy not in POLICIES:
+            raise FedvisionException(
+                f"unknown dispatch policy {policy}, should be one of {POLICIES}"
+            )
+        self.policy = policy
+        self._probes = max(probes, 1)
+        self._random = random.Random(seed)
+        self._workers: MutableMapping[str, object] = {}
+        # free slots over all indexed workers
+        self.free_slots = 0
+        self._level_of: MutableMapping[str, int] = {}
+
+        # free slots -> worker ids, only levels greater than zero
+        self._buckets: MutableMapping[int, MutableMapping[str, None]] = {}
+        self._levels: List[int] = []
+
+        # worker ids with free slots, for uniform sampling
+        self._available: List[str] = []
+        self._available_pos: MutableMapping[str, int] = {}
+
+    def __len__(self):
+        return len(self._workers)
+
+    def __contains__(self, worker_id):
+        return worker_id in self._workers
+
+    def add(self, worker):
+        self.remove(worker.worker_id)
+        self._workers[worker.worker_id] = worker
+        self._insert(worker.worker_id, worker.num_task_remind)
+
+    def remove(self, worker_id):
+        if worker_id not in self._workers:
+            return
+        self._discard(worker_id)
+        del self._workers[worker_id]
+
+    def update(self, worker):
+        """
+        re-index worker after its free slots changed
+        """
+        if worker.worker_id not in self._workers:
+            return
+        if self._level_of[worker.worker_id] == worker.num_task_remind:
+            return
+        self._discard(worker.worker_id)
+        self._insert(worker.worker_id, worker.num_task_remind)
+
+    def select(
+        self,
+        predicate: Optional[Callable[[object], bool]] = None,
+        leftover: Optional[Callable[[object], float]] = None,
+    ):
+        """
+        choose a worker with free slots according to policy
+
+        Args:
+            predicate: extra requirement worker should satisfy, e.g. free endpoints
+            leftover: fraction of scarcest capacity worker would have left after
+                placement, compared among qualified workers if given
+
+        Returns:
+            worker or None if no worker qualified
+        """
+        if self.policy == TWO_CHOICES:
+            worker = self._select_two_choices(predicate, leftover)
+            if worker is not None:
+                return worker
+            # sampled workers not qualified, fall back to the most free one
+            return self._select_ordered(reversed(self._levels), predicate, leftover)
+        if self.policy == BEST_FIT:
+            return self._select_ordered(self._levels, predicate, leftover, min)
+        return self._select_ordered(reversed(self._levels), predicate, leftover)
+
+    def _select_ordered(self, levels, predicate, leftover=None, choose=max):
+        candidates = []
+        for level in levels:
+            for worker_id in self._buckets[level]:
+                worker = self._workers[worker_id]
+                if predicate is None or predicate(worker):
+                    if leftover is None:
+                        return worker
+                    candidates.append(worker)
+                    if len(candidates) >= self._probes:
+                        return choose(candidates, key=leftover)
+        if candidates:
+            return choose(candidates, key=leftover)
+        return None
+
+    def _select_two_choices(self, predicate, leftover=None):
+        if not self._available:
+            return None
+        k = min(2, len(self._available))
+        candidates = [
+            self._workers[self._available[pos]]
+            for pos in self._random.sample(range(len(self._available)), k)
+        ]
+        if predicate is not None:
+            candidates = [worker for worker in candidates if predicate(worker)]
+        if not candidates:
+            return None
+        if leftover is not None:
+            return max(candidates, key=leftover)
+        return max(candidates, key=lambda worker: self._level_of[worker.worker_id])
+
+    def _insert(self, worker_id, level):
+        self._level_of[worker_id] = level
+        if level <= 0:
+            return
+        self.free_slots += level
+        bucket = self._buckets.get(level)
+        if bucket is None:
+            bucket = self._buckets[level] = collections.OrderedDict()
+            bisect.insort(self._levels, level)
+        bucket[worker_id] = None
+        self._available_pos[worker_id] = len(self._available)
+        self._available.append(worker_id)
+
+    def _discard(self, worker_id):
+        level = self._level_of.pop(worker_id)
+        if level <= 0:
+            return
+        self.free_slots -= level
+        bucket = self._buckets[level]
+        del bucket[worker_id]
+        if not bucket:
+            del self._buckets[level]
+            del self._levels[bisect.bisect_left(self._levels, level)]
+
+        # swap with last then pop
+        pos = self._available_pos.pop(worker_id)
+        last = self._available.pop()
+        if last != worker_id:
+            self._available[pos] = last
+            self._available_pos[last] = pos
@@ -13,33 +13,78 @@
 # limitations under the License.
 
 import asyncio
+import heapq
+import itertools
 import time
-from typing import Optional, MutableMapping, AsyncGenerator, Tuple
+from typing import Optional, MutableMapping, AsyncGenerator, Tuple, List, Set
 
+import attr
 import grpc
 
+from fedvision.framework.cluster import task_state
+from fedvision.framework.cluster.dispatcher import SPREAD, WorkerIndex
 from fedvision.framework.protobuf import cluster_pb2, cluster_pb2_grpc, job_pb2
+from fedvision.framework.utils.exception import FedvisionException
 from fedvision.framework.utils.logger import Logger, pretty_pb
 
+# task status reported by worker -> task state
+_TASK_STATE_OF_STATUS = {
+    cluster_pb2.UpdateStatus.TASK_RUNNING: task_state.RUNNING,
+    cluster_pb2.UpdateStatus.TASK_FINISH: task_state.FINISHED,
+    cluster_pb2.UpdateStatus.TASK_EXCEPTION: task_state.FAILED,
+    cluster_pb2.UpdateStatus.TASK_CANCEL: task_state.CANCELLED,
+}
+
+
+# (cpu cores, memory bytes, disk bytes) required besides a task slot
+_NO_DEMAND = (0.0, 0, 0)
+
+
+def _demand_of(resource: job_pb2.Resource) -> Tuple[float, int, int]:
+    return resource.cpu_cores, resource.memory_bytes, resource.disk_bytes
+
+
+@attr.s(slots=True)
+class _Allocation(object):
+    """
+    resource held by a task: one task slot, cpu, memory, disk and endpoints of a worker
+    """
+
+    worker_id = attr.ib(type=str)
+    endpoints = attr.ib(type=List[str], factory=list)
+    demand = attr.ib(type=Tuple[float, int, int], default=_NO_DEMAND)
+
 
 class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
     def __init__(
         self,
         port: int,
         host: str = None,
+        dispatch_policy: str = SPREAD,
     ):
         """
         init cluster manager instance
         Args:
             port:
             host:
+            dispatch_policy: how workers chosen, `spread`, `best_fit` or `two_choices`
         """
         self._host = "[::]" if host is None else host
         self._port = port
         self._alive_workers: MutableMapping[str, _WorkerDescription] = {}
-        self._tasks_status = {}
+        self._worker_index = WorkerIndex(policy=dispatch_policy)
+        # (job_id, task_id) -> resource held until task finished
+        self._allocations: MutableMapping[Tuple[str, str], _Allocation] = {}
+        self._tasks = task_state.TaskTable()
         self._max_heartbeat_delay = 5
 
+        # (deadline, enroll seq, worker_id), one entry per enrolled worker,
+        # deadlines pushed back lazily when popped instead of on every heartbeat
+        self._heartbeat_deadlines: List[Tuple[float, int, str]] = []
+        self._enroll_seq = itertools.count()
+        self._sweeper_wakeup = asyncio.Event()
+        self._sweeper_task: Optional[asyncio.Task] = None
+
         self._server: Optional[grpc.aio.Server] = None
 
     def has_worker(self, worker_id) -> bool:
@@ -53,7 +98,17 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
         """
         return worker_id in self._alive_workers
 
-    def add_worker(self, worker_id, worker_ip, max_tasks, port_start, port_end):
+    def add_worker(
+        self,
+        worker_id,
+        worker_ip,
+        max_tasks,
+        port_start,
+        port_end,
+        cpu_cores=0.0,
+        memory_bytes=0,
+        disk_bytes=0,
+    ):
         """
         add worker to manager
         Args:
@@ -62,6 +117,9 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
             max_tasks:
             port_start:
             port_end:
+            cpu_cores: 0 for not limited
+            memory_bytes: 0 for not limited
+            disk_bytes: 0 for not limited
 
         Returns:
 
@@ -73,24 +131,16 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
             max_delay=self._max_heartbeat_delay,
             port_start=port_start,
             port_end=port_end,
+            capacity=(cpu_cores, memory_bytes, disk_bytes),
         )
         self._alive_workers[worker_id] = worker
-
-        async def _healthy_watcher():
-            try:
-                while True:
-                    await asyncio.sleep(self._max_heartbeat_delay)
-                    if worker_id not in self._alive_workers:
-                        self.error(f"worker:{worker_id} not found")
-                        break
-
-                    if worker.is_asystole():
-                        self.error(f"heartbeat from worker:{worker_id} loss")
-                        break
-            finally:
-                self.remove_worker(worker_id)
-
-        asyncio.create_task(_healthy_watcher())
+        self._worker_index.add(worker)
+        worker.enroll_seq = next(self._enroll_seq)
+        heapq.heappush(
+            self._heartbeat_deadlines,
+            (worker.heartbeat_deadline(), worker.enroll_seq, worker_id),
+        )
+        self._sweeper_wakeup.set()
         return worker
 
     def remove_worker(self, worker_id):
@@ -101,7 +151,73 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
         """
         if worker_id not in self._alive_workers:
             return
-        del self._alive_workers[worker_id]
+        worker = self._alive_workers.pop(worker_id)
+        self._worker_index.remove(worker_id)
+        for task_key in worker.allocated:
+            self._allocations.pop(task_key, None)
+            self._tasks.transit(
+                *task_key, state=task_state.FAILED, exception=f"worker {worker_id} lost"
+            )
+        # ends enroll stream of worker
+        worker.close()
+
+    async def _heartbeat_sweeper(self):
+        """
+        single loop expiring workers whose heartbeat lost,
+        sleeps until the earliest deadline
+        """
+        while True:
+            if not self._heartbeat_deadlines:
+                self._sweeper_wakeup.clear()
+                await self._sweeper_wakeup.wait()
+                continue
+
+            deadline, enroll_seq, worker_id = self._heartbeat_deadlines[0]
+            now = time.time()
+            if deadline > now:
+                await asyncio.sleep(deadline - now)
+                continue
+
+            heapq.heappop(self._heartbeat_deadlines)
+            worker = self._alive_workers.get(worker_id)
+            if worker is None or worker.enroll_seq != enroll_seq:
+                # removed already, or entry of previous enrollment
+                continue
+            if worker.is_asystole():
+                self.error(f"heartbeat from worker:{worker_id} loss")
+                self.remove_worker(worker_id)
+                continue
+            heapq.heappush(
+                self._heartbeat_deadlines,
+                (worker.heartbeat_deadline(), enroll_seq, worker_id),
+            )
+
+    def _allocate(
+        self, task_key, worker: "_WorkerDescription", endpoints=(), demand=_NO_DEMAND
+    ):
+        self._allocations[task_key] = _Allocation(
+            worker_id=worker.worker_id, endpoints=list(endpoints), demand=demand
+        )
+        worker.allocated.add(task_key)
+
+    def _release(self, task_key) -> bool:
+        """
+        give back task slot and endpoints held by task
+
+        Returns:
+            False if task holds nothing
+        """
+        allocation = self._allocations.pop(task_key, None)
+        if allocation is None:
+            return False
+        worker = self._alive_workers.get(allocation.worker_id)
+        if worker is not None:
+            worker.allocated.discard(task_key)
+            worker.release_resource(allocation.demand)
+            worker.release_endpoints(allocation.endpoints)
+            self._worker_index.update(worker)
+        self.debug(f"resource of task {task_key} released")
+        return True
 
     async def Enroll(
         self,
@@ -129,28 +245,35 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
             request.max_tasks,
             request.port_start,
             request.port_end,
+            request.cpu_cores,
+            request.memory_bytes,
+            request.disk_bytes,
         )
         self.debug(f"cluster worker enroll success: worker: {request.worker_id}")
-        yield cluster_pb2.Enroll.REP(status=cluster_pb2.Enroll.ENROLL_SUCCESS)
-
-        while self.has_worker(request.worker_id):
-            try:
-                task = await worker.wait_next_task(timeout=5)
-            except asyncio.TimeoutError:
-                continue
-
-            self.debug(
-                f"task ready: job_id={task.job_id}, task_id={task.task_id}, task_type={task.task_type}"
-            )
-            rep = cluster_pb2.Enroll.REP(
-                status=cluster_pb2.Enroll.TASK_READY, task=task
-            )
-            self.debug(
-                f"response task({task.task_id}, {task.task_type}) to worker {request.worker_id}"
-            )
-            yield rep
-
-        self.remove_worker(request.worker_id)
+        try:
+            yield cluster_pb2.Enroll.REP(status=cluster_pb2.Enroll.ENROLL_SUCCESS)
+
+            while True:
+                # None once worker removed
+                task = await worker.wait_next_task()
+                if task is None:
+                    break
+
+                self.debug(
+                    f"task ready: job_id={task.job_id}, task_id={task.task_id}, task_type={task.task_type}"
+                )
+                rep = cluster_pb2.Enroll.REP(
+                    status=cluster_pb2.Enroll.TASK_READY, task=task
+                )
+                self._tasks.transit(task.job_id, task.task_id, task_state.ASSIGNED)
+                self.debug(
+                    f"response task({task.task_id}, {task.task_type}) to worker {request.worker_id}"
+                )
+                yield rep
+        finally:
+            # stream cancelled by worker disconnect, or worker removed
+            if self._alive_workers.get(request.worker_id) is worker:
+                self.remove_worker(request.worker_id)
 
     async def UpdateTaskStatus(
         self, request: cluster_pb2.UpdateStatus.REQ, context: grpc.aio.ServicerContext
@@ -171,13 +294,95 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
         if not request.task_id:
             return cluster_pb2.UpdateStatus.REP(status=cluster_pb2.UpdateStatus.SUCCESS)
 
-        if not request.task_id not in self._tasks_status:
+        if self._tasks.get(request.job_id, request.task_id) is None:
+            return cluster_pb2.UpdateStatus.REP(status=cluster_pb2.UpdateStatus.FAILED)
+
+        state = _TASK_STATE_OF_STATUS.get(request.task_status)
+        if state is None:
             return cluster_pb2.UpdateStatus.REP(status=cluster_pb2.UpdateStatus.FAILED)
 
         self.debug(f"update task status: {request.task_id} to {request.task_status}")
-        self._tasks_status[request.task_id] = request.task_status
+        # stale or repeated updates ignored
+        self._tasks.transit(
+            request.job_id,
+            request.task_id,
+            state=state,
+            exception=request.exception,
+            round_time=request.round_time,
+        )
+        if state in task_state.DONE_STATES:
+            self._release((request.job_id, request.task_id))
         return cluster_pb2.UpdateStatus.REP(status=cluster_pb2.UpdateStatus.SUCCESS)
 
+    async def TaskStatus(
+        self, request: cluster_pb2.TaskStatus.REQ, context: grpc.aio.ServicerContext
+    ) -> cluster_pb2.TaskStatus.REP:
+        """
+        process task status query, tasks unknown to manager omitted
+        Args:
+            request:
+            context:
+
+        Returns:
+
+        """
+        if request.task_ids:
+            records = [
+                self._tasks.get(request.job_id, task_id) for task_id in request.task_ids
+            ]
+        else:
+            records = self._tasks.tasks_of_job(request.job_id)
+        return cluster_pb2.TaskStatus.REP(
+            tasks=[record.to_pb() for record in records if record is not None]
+        )
+
+    async def WatchTasks(
+        self, request: cluster_pb2.WatchTasks.REQ, context: grpc.aio.ServicerContext
+    ) -> AsyncGenerator[cluster_pb2.WatchTasks.REP, None]:
+        """
+        stream current state of tasks changed after `since`, then every later change
+        Args:
+            request:
+            context:
+
+        Returns:
+
+        """
+        job_ids = list(request.job_ids)
+        queue = self._tasks.subscribe(job_ids)
+        try:
+            # built before any yield, so snapshot holds states as of subscribing and
+            # changes queued meanwhile are all newer
+            snapshot = [
+                cluster_pb2.WatchTasks.REP(task=record.to_pb())
+                for record in self._tasks.changed_since(job_ids, request.since)
+            ]
+            for response in snapshot:
+                yield response
+            while True:
+                yield cluster_pb2.WatchTasks.REP(task=await queue.get())
+        finally:
+            self._tasks.unsubscribe(queue, job_ids)
+
+    async def ClusterCapacity(
+        self,
+        request: cluster_pb2.ClusterCapacity.REQ,
+        context: grpc.aio.ServicerContext,
+    ) -> cluster_pb2.ClusterCapacity.REP:
+        """
+        process capacity query
+        Args:
+            request:
+            context:
+
+        Returns:
+
+        """
+        return cluster_pb2.ClusterCapacity.REP(
+            num_workers=len(self._alive_workers),
+            free_task_slots=self._worker_index.free_slots,
+        )
+
     async def TaskSubmit(
         self, request: cluster_pb2.TaskSubmit.REQ, context: grpc.aio.ServicerContext
     ) -> cluster_pb2.TaskSubmit.REP:
@@ -190,17 +395,63 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
         Returns:
 
         """
+        return await self._submit_task(request.task)
+
+    async def TaskSubmitBatch(
+        self,
+        request: cluster_pb2.TaskSubmitBatch.REQ,
+        context: grpc.aio.ServicerContext,
+    ) -> cluster_pb2.TaskSubmitBatch.REP:
+        """
+        process batched task submit request, one result per task
+
+        Args:
+            request:
+            context:
+
+        Returns:
+
+        """
+        response = cluster_pb2.TaskSubmitBatch.REP()
+        for task in request.tasks:
+            response.results.append(await self._submit_task(task))
+        return response
+
+    async def _submit_task(self, task: job_pb2.Task) -> cluster_pb2.TaskSubmit.REP:
+        task_key = (task.job_id, task.task_id)
         try:
-            task = request.task
-            if not task.assignee:
-                worker, _ = await self.dispatch()
-                await worker.put_task(task=task)
+            if task_key in self._allocations:
+                # resource required in advance
+                worker = self._alive_workers[self._allocations[task_key].worker_id]
+            elif not task.assignee:
+                demand = _demand_of(task.resource)
+                worker, _ = await self.dispatch(resource={"demand": demand})
+                if worker is None:
+                    raise FedvisionException(
+                        f"no worker has free task slot and resource {demand}"
+                    )
+                self._allocate(task_key, worker, demand=demand)
             else:
-                await self._alive_workers[task.assignee].put_task(task=task)
+                demand = _demand_of(task.resource)
+                worker = self._alive_workers.get(task.assignee)
+                if worker is None:
+                    raise FedvisionException(f"assignee {task.assignee} not alive")
+                # never oversubscribe, free slots and resource stay non-negative
+                if not worker.fits(demand):
+                    raise FedvisionException(
+                        f"assignee {task.assignee} has no free task slot and resource {demand}"
+                    )
+                worker.take_resource(demand)
+                self._worker_index.update(worker)
+                self._allocate(task_key, worker, demand=demand)
+            self._tasks.add(task, worker.worker_id)
+            await worker.put_task(task=task)
             return cluster_pb2.TaskSubmit.REP(status=cluster_pb2.TaskSubmit.SUCCESS)
         except Exception as e:
             self.exception(f"handle task submit failed: {e}")
-            return cluster_pb2.TaskSubmit.REP(status=cluster_pb2.TaskSubmit.FAILED)
+            return cluster_pb2.TaskSubmit.REP(
+                status=cluster_pb2.TaskSubmit.FAILED, exception=str(e)
+            )
 
     async def TaskResourceRequire(self, request, context):
         """
@@ -212,14 +463,25 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
         Returns:
 
         """
+        demand = _demand_of(request.resource)
         worker, endpoints = await self.dispatch(
-            resource={"endpoints": request.num_endpoints}
+            resource={"endpoints": request.num_endpoints, "demand": demand}
         )
         if worker is None:
             return cluster_pb2.TaskResourceRequire.REP(
                 status=cluster_pb2.TaskResourceRequire.FAILED
             )
 
+        if request.task_id:
+            self._allocate(
+                (request.job_id, request.task_id), worker, endpoints, demand
+            )
+        else:
+            self.warning(
+                f"resource required without task id, "
+                f"task slot and endpoints of worker {worker.worker_id} will not be reclaimed"
+            )
+
         response = cluster_pb2.TaskResourceRequire.REP(
             status=cluster_pb2.TaskResourceRequire.SUCCESS, worker_id=worker.worker_id
         )
@@ -227,6 +489,24 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
             response.endpoints.append(endpoint)
         return response
 
+    async def TaskResourceRelease(self, request, context):
+        """
+        process resource release request of task never submitted
+        Args:
+            request:
+            context:
+
+        Returns:
+
+        """
+        if self._release((request.job_id, request.task_id)):
+            return cluster_pb2.TaskResourceRelease.REP(
+                status=cluster_pb2.TaskResourceRelease.SUCCESS
+            )
+        return cluster_pb2.TaskResourceRelease.REP(
+            status=cluster_pb2.TaskResourceRelease.FAILED
+        )
+
     async def start(self):
         """
         start cluster manager service
@@ -243,12 +523,15 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
         cluster_pb2_grpc.add_ClusterManagerServicer_to_server(self, self._server)
         self._server.add_insecure_port(f"{self._host}:{self._port}")
         await self._server.start()
+        self._sweeper_task = asyncio.create_task(self._heartbeat_sweeper())
         self.info(f"cluster manager started at port: {self._port}")
 
     async def stop(self):
         """
         stop cluster manager service
         """
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
         await self._server.stop(1)
 
     async def dispatch(
@@ -257,31 +540,39 @@ class ClusterManager(Logger, cluster_pb2_grpc.ClusterManagerServicer):
         """
         dispatch tasks to worker
         Args:
-            resource:
+            resource: `endpoints`: number of endpoints,
+                `demand`: (cpu cores, memory bytes, disk bytes) besides a task slot
 
         Returns:
 
         """
         if resource is None:
             resource = {}
-        if not resource:
-            for k, v in self._alive_workers.items():
-                if v.has_task_capacity():
-                    v.task_task_capacity()
-                    return v, []
-        elif "endpoints" in resource:
-            num_endpoints = resource["endpoints"]
-            for k, v in self._alive_workers.items():
-                if v.has_num_valid_endpoints(num_endpoints) and v.has_task_capacity():
-                    v.task_task_capacity()
-                    endpoints = v.take_endpoints(num_endpoints)
-                    return v, endpoints
-        return None, []
+        num_endpoints = resource.get("endpoints", 0)
+        demand = resource.get("demand", _NO_DEMAND)
+        worker = self._worker_index.select(
+            lambda w: w.fits(demand) and w.has_num_valid_endpoints(num_endpoints),
+            # pack across dimensions only when task asks for more than a slot
+            leftover=None if demand == _NO_DEMAND else lambda w: w.leftover(demand),
+        )
+        if worker is None:
+            return None, []
+        worker.take_resource(demand)
+        self._worker_index.update(worker)
+        endpoints = worker.take_endpoints(num_endpoints) if num_endpoints else []
+        return worker, endpoints
 
 
 class _WorkerDescription(object):
     def __init__(
-        self, worker_id, worker_ip, max_tasks, max_delay, port_start, port_end
+        self,
+        worker_id,
+        worker_ip,
+        max_tasks,
+        max_delay,
+        port_start,
+        port_end,
+        capacity=_NO_DEMAND,
     ):
         self.worker_id = worker_id
         self.worker_ip = worker_ip
@@ -290,16 +581,22 @@ class _WorkerDescription(object):
         self._max_tasks = max_tasks
         self._max_delay = max_delay
         self._last_heartbeat = time.time()
-        self._task_queue: asyncio.Queue[job_pb2.Task] = asyncio.Queue()
-        self._port_used = [False] * (
-            self._port_end - self._port_start
-        )  # todo: use memory-friendly data structure
-        self.num_port_remind = self._port_end - self._port_start
+        self._task_queue: asyncio.Queue[Optional[job_pb2.Task]] = asyncio.Queue()
+        self.enroll_seq = 0
+        self._ports = _PortAllocator(port_start, port_end)
         self.num_task_remind = self._max_tasks
-        self._current_pos = 0
+        # (cpu cores, memory bytes, disk bytes), capacity 0 for not limited
+        self._capacity = tuple(capacity)
+        self._free = list(capacity)
+        # (job_id, task_id) of tasks holding resource of this worker
+        self.allocated: Set[Tuple[str, str]] = set()
+
+    @property
+    def num_port_remind(self):
+        return self._ports.num_free
 
     def has_num_valid_endpoints(self, num):
-        return self.num_task_remind >= num
+        return self._ports.num_free >= num
 
     def has_task_capacity(self):
         return self.num_task_remind > 0
@@ -307,19 +604,44 @@ class _WorkerDescription(object):
     def task_task_capacity(self):
         self.num_task_remind -= 1
 
+    def release_task_capacity(self):
+        self.num_task_remind = min(self.num_task_remind + 1, self._max_tasks)
+
+    def fits(self, demand) -> bool:
+        return self.has_task_capacity() and all(
+            need <= 0 or cap <= 0 or need <= free
+            for cap, free, need in zip(self._capacity, self._free, demand)
+        )
+
+    def leftover(self, demand) -> float:
+        """
+        fraction of the scarcest capacity left if a task with `demand` placed,
+        task slots included
+        """
+        shares = [(self.num_task_remind - 1) / max(self._max_tasks, 1)]
+        for cap, free, need in zip(self._capacity, self._free, demand):
+            if cap > 0:
+                shares.append((free - need) / cap)
+        return min(shares)
+
+    def take_resource(self, demand):
+        self.task_task_capacity()
+        for i, need in enumerate(demand):
+            self._free[i] -= need
+
+    def release_resource(self, demand):
+        self.release_task_capacity()
+        for i, need in enumerate(demand):
+            self._free[i] += need
+
     def take_endpoints(self, num):
-        endpoints = []
-        for i in range(num):
-            endpoints.append(self._next_valid_endpoint())
-        return endpoints
-
-    def _next_valid_endpoint(self):
-        for i in range(self._port_end - self._port_start):
-            index = (i + self._current_pos) % (self._port_end - self._port_start)
-            if not self._port_used[index]:
-                self._current_pos = index + 1
-                return f"{self.worker_ip}:{self._port_start + index}"
-        raise Exception(f"no endpoint left")
+        if self._ports.num_free < num:
+            raise FedvisionException(f"no endpoint left")
+        return [f"{self.worker_ip}:{self._ports.allocate()}" for _ in range(num)]
+
+    def release_endpoints(self, endpoints):
+        for endpoint in endpoints:
+            self._ports.release(int(endpoint.rsplit(":", 1)[1]))
 
     async def put_task(self, task: job_pb2.Task):
         return await self._task_queue.put(task)
@@ -328,9 +650,53 @@ class _WorkerDescription(object):
         t = time.time()
         self._last_heartbeat = t
 
+    def heartbeat_deadline(self):
+        return self._last_heartbeat + self._max_delay
+
     def is_asystole(self):
         t = time.time()
         return t - self._last_heartbeat > self._max_delay
 
-    async def wait_next_task(self, timeout):
-        return await asyncio.wait_for(self._task_queue.get(), timeout=timeout)
+    def close(self):
+        self._task_queue.put_nowait(None)
+
+    async def wait_next_task(self) -> Optional[job_pb2.Task]:
+        return await self._task_queue.get()
+
+
+class _PortAllocator(object):
+    """
+    free ports of range [port_start, port_end) as bits of an int.
+
+    Allocation takes the lowest free port from a cursor moving forward, so a
+    released port is not handed out again right away (may still be in TIME_WAIT).
+    Both allocate and release are a few big int operations on a bitmap of range
+    size, no scan over ports in python.
+    """
+
+    def __init__(self, port_start, port_end):
+        self._port_start = port_start
+        self._size = max(port_end - port_start, 0)
+        self._free = (1 << self._size) - 1
+        self._cursor = 0
+        self.num_free = self._size
+
+    def allocate(self) -> int:
+        if not self._free:
+            raise FedvisionException(f"no endpoint left")
+        candidates = self._free >> self._cursor << self._cursor
+        if not candidates:
+            candidates = self._free
+        lowest = candidates & -candidates
+        index = lowest.bit_length() - 1
+        self._free ^= lowest
+        self._cursor = (index + 1) % self._size
+        self.num_free -= 1
+        return self._port_start + index
+
+    def release(self, port: int):
+        index = port - self._port_start
+        if not 0 <= index < self._size or self._free >> index & 1:
+            return
+        self._free |= 1 << index
+        self.num_free += 1
@@ -0,0 +1,211 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+task states of cluster manager.
+
+A task moves QUEUED -> ASSIGNED -> RUNNING -> FINISHED | FAILED | CANCELLED,
+states may be skipped (a worker may report finish without reporting running)
+but never go back. Every transition gets a manager wide, increasing version
+and is pushed to watchers of the task's job.
+"""
+
+import asyncio
+import collections
+import time
+from typing import Iterable, List, MutableMapping, Optional, Set, Tuple
+
+import attr
+
+from fedvision.framework.protobuf import cluster_pb2, job_pb2
+
+QUEUED = cluster_pb2.QUEUED
+ASSIGNED = cluster_pb2.ASSIGNED
+RUNNING = cluster_pb2.RUNNING
+FINISHED = cluster_pb2.FINISHED
+FAILED = cluster_pb2.FAILED
+CANCELLED = cluster_pb2.CANCELLED
+
+DONE_STATES = (FINISHED, FAILED, CANCELLED)
+
+_ORDER = {QUEUED: 0, ASSIGNED: 1, RUNNING: 2, FINISHED: 3, FAILED: 3, CANCELLED: 3}
+_TIME_FIELD = {
+    QUEUED: "queued_time",
+    ASSIGNED: "assigned_time",
+    RUNNING: "start_time",
+    FINISHED: "end_time",
+    FAILED: "end_time",
+    CANCELLED: "end_time",
+}
+
+
+@attr.s(slots=True)
+class TaskRecord(object):
+    job_id = attr.ib(type=str)
+    task_id = attr.ib(type=str)
+    task_type = attr.ib(type=str)
+    worker_id = attr.ib(type=str)
+    state = attr.ib(type=int, default=QUEUED)
+    queued_time = attr.ib(type=float, default=0.0)
+    assigned_time = attr.ib(type=float, default=0.0)
+    start_time = attr.ib(type=float, default=0.0)
+    end_time = attr.ib(type=float, default=0.0)
+    exception = attr.ib(type=str, default="")
+    version = attr.ib(type=int, default=0)
+    round_time = attr.ib(type=float, default=0.0)
+
+    def to_pb(self) -> cluster_pb2.TaskInfo:
+        return cluster_pb2.TaskInfo(
+            job_id=self.job_id,
+            task_id=self.task_id,
+            task_type=self.task_type,
+            worker_id=self.worker_id,
+            state=self.state,
+            queued_time=self.queued_time,
+            assigned_time=self.assigned_time,
+            start_time=self.start_time,
+            end_time=self.end_time,
+            exception=self.exception,
+            version=self.version,
+            round_time=self.round_time,
+        )
+
+
+class TaskTable(object):
+    """
+    state of tasks by job, finished tasks beyond `max_finished` dropped oldest first
+    """
+
+    def __init__(self, max_finished: int = 100000):
+        self.version = 0
+        self._max_finished = max_finished
+        self._jobs: MutableMapping[str, MutableMapping[str, TaskRecord]] = {}
+        self._finished: MutableMapping[
+            Tuple[str, str], None
+        ] = collections.OrderedDict()
+        # job id -> queues of watchers, key None for watchers of all jobs
+        self._watchers: MutableMapping[
+            Optional[str], Set[asyncio.Queue]
+        ] = collections.defaultdict(set)
+
+    def get(self, job_id: str, task_id: str) -> Optional[TaskRecord]:
+        return self._jobs.get(job_id, {}).get(task_id)
+
+    def tasks_of_job(self, job_id: str) -> List[TaskRecord]:
+        return list(self._jobs.get(job_id, {}).values())
+
+    def add(self, task: job_pb2.Task, worker_id: str) -> TaskRecord:
+        """
+        record task queued to worker, replaces previous record of same task
+        """
+        record = TaskRecord(
+            job_id=task.job_id,
+            task_id=task.task_id,
+            task_type=task.task_type,
+            worker_id=worker_id,
+            queued_time=time.time(),
+        )
+        self._finished.pop((task.job_id, task.task_id), None)
+        self._jobs.setdefault(task.job_id, {})[task.task_id] = record
+        self._publish(record)
+        return record
+
+    def transit(
+        self,
+        job_id: str,
+        task_id: str,
+        state: int,
+        exception: str = "",
+        round_time: float = 0.0,
+    ) -> Optional[TaskRecord]:
+        """
+        move task to `state`
+
+        Returns:
+            None if task unknown or already in or past `state`
+        """
+        record = self.get(job_id, task_id)
+        if record is None:
+            return None
+        if record.state in DONE_STATES or _ORDER[state] <= _ORDER[record.state]:
+            return None
+        record.state = state
+        setattr(record, _TIME_FIELD[state], time.time())
+        if exception:
+            record.exception = exception
+        if round_time > 0:
+            record.round_time = round_time
+        if state in DONE_STATES:
+            self._finished[(job_id, task_id)] = None
+            self._evict()
+        self._publish(record)
+        return record
+
+    def changed_since(self, job_ids: Iterable[str], since: int) -> List[TaskRecord]:
+        """
+        tasks of `job_ids` (all jobs if empty) changed after version `since`, oldest change first
+        """
+        job_ids = list(job_ids)
+        jobs = (
+            [self._jobs.get(job_id, {}) for job_id in job_ids]
+            if job_ids
+            else self._jobs.values()
+        )
+        records = [
+            record
+            for tasks in jobs
+            for record in tasks.values()
+            if record.version > since
+        ]
+        records.sort(key=lambda r: r.version)
+        return records
+
+    def subscribe(self, job_ids: Iterable[str]) -> asyncio.Queue:
+        """
+        queue receiving `TaskInfo` of every later change of tasks of `job_ids` (all jobs if empty)
+        """
+        queue = asyncio.Queue()
+        for job_id in list(job_ids) or [None]:
+            self._watchers[job_id].add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, job_ids: Iterable[str]):
+        for job_id in list(job_ids) or [None]:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(queue)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    def _publish(self, record: TaskRecord):
+        self.version += 1
+        record.version = self.version
+        queues = self._watchers.get(record.job_id, set()) | self._watchers.get(
+            None, set()
+        )
+        if not queues:
+            return
+        info = record.to_pb()
+        for queue in queues:
+            queue.put_nowait(info)
+
+    def _evict(self):
+        while len(self._finished) > self._max_finished:
+            (job_id, task_id), _ = self._finished.popitem(last=False)
+            tasks = self._jobs.get(job_id)
+            if tasks is None:
+                continue
+            tasks.pop(task_id, None)
+            if not tasks:
+                del self._jobs[job_id]
@@ -31,6 +31,11 @@ from fedvision.framework.utils.exception import (
     FedvisionException,
 )
 from fedvision.framework.utils.logger import Logger, pretty_pb
+from fedvision.framework.utils.tracing import (
+    JobTracer,
+    ROUND_TIMES_FILE,
+    recent_round_time,
+)
 
 
 class ClusterWorker(Logger):
@@ -43,6 +48,9 @@ class ClusterWorker(Logger):
         port_end: int,
         manager_address: str,
         data_dir: str = None,
+        cpu_cores: float = 0.0,
+        memory_bytes: int = 0,
+        disk_bytes: int = 0,
     ):
         """
         init cluster worker instance
@@ -54,6 +62,9 @@ class ClusterWorker(Logger):
             port_end:
             manager_address:
             data_dir:
+            cpu_cores: cpu cores shared by tasks, 0 for not limited
+            memory_bytes: memory shared by tasks, 0 for not limited
+            disk_bytes: disk shared by tasks, 0 for not limited
         """
         self._task_queue: asyncio.Queue = asyncio.Queue()
         self._semaphore = asyncio.Semaphore(max_tasks)
@@ -64,6 +75,9 @@ class ClusterWorker(Logger):
         self._max_tasks = max_tasks
         self._port_start = port_start
         self._port_end = port_end
+        self._cpu_cores = cpu_cores
+        self._memory_bytes = memory_bytes
+        self._disk_bytes = disk_bytes
         self._heartbeat_interval = 1
         self._data_dir = data_dir
 
@@ -105,6 +119,9 @@ class ClusterWorker(Logger):
                 max_tasks=self._max_tasks,
                 port_start=self._port_start,
                 port_end=self._port_end,
+                cpu_cores=self._cpu_cores,
+                memory_bytes=self._memory_bytes,
+                disk_bytes=self._disk_bytes,
             )
         )
         first_response = True
@@ -223,14 +240,27 @@ class ClusterWorker(Logger):
             self.info(f"all unfinished asyncio tasks canceled")
 
     async def _task_exec_coroutine(self, _task: Task):
+        task_dir = Path(__logs_dir__).joinpath(f"jobs/{_task.job_id}/{_task.task_id}")
+        tracer = JobTracer(_task.job_id, path=task_dir.joinpath("trace.jsonl"))
+        span = tracer.start_span(
+            "task",
+            task_id=_task.task_id,
+            task_type=_task.task_type,
+            worker_id=self._worker_id,
+        )
         try:
             self.info(
                 f"start to exec task, job_id={_task.job_id}, task_id={_task.task_id}, task_type={_task.task_type}"
             )
-            executor = ProcessExecutor(
-                Path(__logs_dir__).joinpath(f"jobs/{_task.job_id}/{_task.task_id}"),
-                data_dir=self._data_dir,
+            await self._task_status.put(
+                cluster_pb2.UpdateStatus.REQ(
+                    worker_id=self._worker_id,
+                    job_id=_task.job_id,
+                    task_id=_task.task_id,
+                    task_status=cluster_pb2.UpdateStatus.TASK_RUNNING,
+                )
             )
+            executor = ProcessExecutor(task_dir, data_dir=self._data_dir)
             response = await _task.exec(executor)
             self.info(
                 f"finish exec task, job_id={_task.job_id}, task_id={_task.task_id}"
@@ -244,6 +274,8 @@ class ClusterWorker(Logger):
                     task_id=_task.task_id,
                     task_status=cluster_pb2.UpdateStatus.TASK_FINISH,
                     exec_result=response,
+                    # written by trainers, see `RoundTimer`
+                    round_time=recent_round_time(task_dir.joinpath(ROUND_TIMES_FILE)),
                 )
             )
             self.info(
@@ -253,6 +285,7 @@ class ClusterWorker(Logger):
 
         except Exception as e:
             self.exception(e)
+            span.error = repr(e)
             await self._task_status.put(
                 cluster_pb2.UpdateStatus.REQ(
                     worker_id=self._worker_id,
@@ -263,6 +296,8 @@ class ClusterWorker(Logger):
                 )
             )
         finally:
+            span.end()
+            tracer.export(span)
             self._semaphore.release()
             self.trace_lazy(
                 f"semaphore released, current: {{current}}",
@@ -15,22 +15,91 @@
 from __future__ import annotations
 
 import asyncio
-import random
+import heapq
+import math
 import time
-from typing import Optional, MutableMapping, MutableSet, List, AsyncGenerator
+from typing import (
+    Optional,
+    MutableMapping,
+    MutableSet,
+    List,
+    AsyncGenerator,
+    Tuple,
+    Set,
+    Mapping,
+)
 
 import attr
 import grpc
 
+from fedvision.framework.coordinator.selection import (
+    SelectionPolicy,
+    get_selection_policy,
+)
 from fedvision.framework.protobuf import coordinator_pb2_grpc, coordinator_pb2, job_pb2
+from fedvision.framework.utils.blob import BLOB_CHUNK_SIZE, blob_digest
+from fedvision.framework.utils.exception import FedvisionException
 from fedvision.framework.utils.logger import Logger
+from fedvision.framework.utils.metrics import MetricsRegistry, MetricsServer
 
 
 @attr.s
 class _TaskProviderForEnrolledParty(object):
+    job_types = attr.ib(type=List[str], factory=list)
+    capacity = attr.ib(type=coordinator_pb2.Capacity, factory=coordinator_pb2.Capacity)
+
     def __attrs_post_init__(self):
-        self.queue: asyncio.Queue[_Proposal] = asyncio.Queue()
+        self.queue: asyncio.Queue[Optional[_Proposal]] = asyncio.Queue()
         self.closed = False
+        self.last_heartbeat = time.time()
+
+    def update_heartbeat(self, capacity: Optional[coordinator_pb2.Capacity] = None):
+        self.last_heartbeat = time.time()
+        if capacity is not None:
+            self.capacity = capacity
+
+    def is_asystole(self, max_delay):
+        return time.time() - self.last_heartbeat > max_delay
+
+    def close(self):
+        """
+        mark provider closed and wake up the subscribe stream waiting on queue
+        """
+        if self.closed:
+            return
+        self.closed = True
+        # `None` is the close signal, consumer stops once it was got
+        self.queue.put_nowait(None)
+
+
+@attr.s
+class _BlobStore(object):
+    """
+    content addressed payloads shared by proposals, reference counted
+    """
+
+    def __attrs_post_init__(self):
+        self._blobs: MutableMapping[str, bytes] = {}
+        self._references: MutableMapping[str, int] = {}
+        self.size = 0
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def get(self, digest) -> Optional[bytes]:
+        return self._blobs.get(digest)
+
+    def acquire(self, digest, data: bytes):
+        if digest not in self._blobs:
+            self._blobs[digest] = data
+            self.size += len(data)
+        self._references[digest] = self._references.get(digest, 0) + 1
+
+    def release(self, digest):
+        self._references[digest] -= 1
+        if self._references[digest] <= 0:
+            del self._references[digest]
+            self.size -= len(self._blobs.pop(digest))
 
 
 @attr.s
@@ -41,22 +110,38 @@ class _Proposal(object):
     deadline = attr.ib(type=int)
     minimum_acceptance = attr.ib(type=int)
     maximum_acceptance = attr.ib(type=int)
+    selection_policy = attr.ib(type=str, default="")
     goal_reached = attr.ib(type=bool, default=False)
 
     def __attrs_post_init__(self):
         self.responders = set()
+        # responders closing open period early, raised for oversubscribing policies
+        self.open_threshold = self.maximum_acceptance
         self.open_period_finished = asyncio.Event()
+        self.maximum_reached = asyncio.Event()
         self.chosen = {}
+        self.payload_size = sum(task.ByteSize() for task in self.tasks)
+        self.blob_digests: Set[str] = {
+            digest for task in self.tasks for digest in task.blob_refs.values()
+        }
 
     @classmethod
     def from_pb(cls, uid, pb: coordinator_pb2.Proposal.REQ):
+        # copy tasks out of request. payloads are opaque to coordinator (message
+        # types of tasks are not loaded here), proposer extracts them into blobs
+        tasks = []
+        for task_pb in pb.tasks:
+            task = job_pb2.Task()
+            task.CopyFrom(task_pb)
+            tasks.append(task)
         return _Proposal(
             uid=uid,
             job_type=pb.job_type,
-            tasks=pb.tasks,
+            tasks=tasks,
             deadline=time.time() + pb.proposal_wait_time,
             minimum_acceptance=pb.minimum_acceptance,
             maximum_acceptance=pb.maximum_acceptance,
+            selection_policy=pb.selection_policy,
         )
 
     def has_enough_responders(self):
@@ -64,39 +149,137 @@ class _Proposal(object):
 
     def add_responders(self, party_id):
         self.responders.add(party_id)
+        if len(self.responders) >= self.open_threshold:
+            self.maximum_reached.set()
 
-    def set_open_period_finished(self, goal_reached):
+    async def wait_open_period(self, timeout):
+        """
+        wait until `open_threshold` responders arrived or timeout, whichever comes first
+        """
+        try:
+            await asyncio.wait_for(self.maximum_reached.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def set_open_period_finished(
+        self,
+        goal_reached,
+        policy: SelectionPolicy,
+        capacities: Mapping[str, coordinator_pb2.Capacity],
+    ):
         self.goal_reached = goal_reached
-        if len(self.responders) > self.maximum_acceptance:
-            for i, responder in enumerate(
-                random.choices(list(self.responders), k=self.maximum_acceptance)
-            ):
-                self.chosen[responder] = self.tasks[i]
-        else:
-            for i, responder in enumerate(list(self.responders)):
-                self.chosen[responder] = self.tasks[i]
+        chosen = policy.select(
+            list(self.responders), capacities, k=self.maximum_acceptance
+        )
+        for i, responder in enumerate(chosen):
+            self.chosen[responder] = self.tasks[i]
         self.open_period_finished.set()
 
 
 class Coordinator(Logger, coordinator_pb2_grpc.CoordinatorServicer):
-    def __init__(self, port: int):
+    def __init__(
+        self,
+        port: int,
+        proposal_retention: float = 60,
+        party_heartbeat_timeout: float = 30,
+        selection_policy: str = "uniform",
+        metrics_port: Optional[int] = None,
+        oversubscription: float = 2.0,
+    ):
         """
         init coordinator
 
         Args:
             port: coordinator serving port
+            proposal_retention: seconds to keep a proposal after its open period ends
+            party_heartbeat_timeout: seconds without heartbeat before a party is evicted
+            selection_policy: default policy to choose participants from responders
+            metrics_port: port to serve prometheus metrics, disabled if None
+            oversubscription: for policies other than uniform, open period lasts until
+                `maximum_acceptance * oversubscription` responders arrived or deadline,
+                so the policy chooses among more parties than it takes
         """
         self._serving = True
         self._enrolled: MutableMapping[str, _TaskProviderForEnrolledParty] = {}
         self._proposals: MutableMapping[str, _Proposal] = {}
         self._job_type_to_subscribes: MutableMapping[str, MutableSet[str]] = {}
-        self._check_interval = 0.5
         self._count_id = 0
 
+        # min-heap of (expire time, proposal id), evicted by `_proposal_gc_loop`
+        self._proposal_retention = proposal_retention
+        self._proposal_expire_heap: List[Tuple[float, str]] = []
+        self._proposal_gc_wakeup = asyncio.Event()
+        self._proposal_gc_task: Optional[asyncio.Task] = None
+        self._proposal_payload_size = 0
+        self._blob_store = _BlobStore()
+
+        self._party_heartbeat_timeout = party_heartbeat_timeout
+        self._party_liveness_task: Optional[asyncio.Task] = None
+
+        self._selection_policy = get_selection_policy(selection_policy)
+        if self._selection_policy is None:
+            raise FedvisionException(f"selection policy {selection_policy} not found")
+        self._oversubscription = max(oversubscription, 1.0)
+
         self._grpc_port = port
         self._grpc_server = None
 
+        self._metrics_port = metrics_port
+        self._metrics_server: Optional[MetricsServer] = None
+        self._init_metrics()
+
+    def _init_metrics(self):
+        self.metrics = MetricsRegistry()
+        self._metric_proposals_received = self.metrics.counter(
+            "fedvision_coordinator_proposals_received_total",
+            "proposals received",
+        )
+        self._metric_proposals = self.metrics.counter(
+            "fedvision_coordinator_proposals_total",
+            "proposals handled, by response status",
+            ["status"],
+        )
+        self._metric_open_period = self.metrics.histogram(
+            "fedvision_coordinator_open_period_seconds",
+            "duration of proposal open period",
+        )
+        self._metric_responders = self.metrics.histogram(
+            "fedvision_coordinator_proposal_responders",
+            "number of responders when proposal open period finished",
+            buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+        )
+        self._metric_fetch_task_wait = self.metrics.histogram(
+            "fedvision_coordinator_fetch_task_wait_seconds",
+            "time FetchTask waits for proposal open period",
+        )
+        self.metrics.gauge(
+            "fedvision_coordinator_enrolled_parties",
+            "number of enrolled parties",
+        ).set_function(lambda: len(self._enrolled))
+        self.metrics.gauge(
+            "fedvision_coordinator_party_queue_depth",
+            "proposals queued for party but not yet delivered",
+            ["party_id"],
+        ).set_function(
+            lambda: {
+                (party_id,): task_provider.queue.qsize()
+                for party_id, task_provider in self._enrolled.items()
+            }
+        )
+        self.metrics.gauge(
+            "fedvision_coordinator_retained_proposals",
+            "proposals retained in memory",
+        ).set_function(lambda: len(self._proposals))
+        self.metrics.gauge(
+            "fedvision_coordinator_blob_bytes",
+            "bytes of task payloads in blob store",
+        ).set_function(lambda: self._blob_store.size)
+
     async def start(self):
+        if self._metrics_port is not None:
+            self._metrics_server = MetricsServer(self.metrics, port=self._metrics_port)
+            await self._metrics_server.start()
+
         self.info(f"starting grpc server")
         self._grpc_server = grpc.aio.server(
             options=[
@@ -108,11 +291,117 @@ class Coordinator(Logger, coordinator_pb2_grpc.CoordinatorServicer):
         self._grpc_server.add_insecure_port(f"[::]:{self._grpc_port}")
         await self._grpc_server.start()
         self.info(f"grpc server started at port {self._grpc_port}")
+        self._proposal_gc_task = asyncio.create_task(self._proposal_gc_loop())
+        self._party_liveness_task = asyncio.create_task(self._party_liveness_loop())
 
     async def stop(self):
         self.info(f"stopping grpc server gracefully")
         await self._grpc_server.stop(1)
         self.info(f"grpc server stopped")
+        if self._proposal_gc_task is not None:
+            self._proposal_gc_task.cancel()
+            self._proposal_gc_task = None
+        if self._party_liveness_task is not None:
+            self._party_liveness_task.cancel()
+            self._party_liveness_task = None
+        if self._metrics_server is not None:
+            await self._metrics_server.stop()
+            self._metrics_server = None
+
+    def memory_usage(self) -> dict:
+        """
+        report retained objects and the bytes of task payloads they hold
+        """
+        return dict(
+            enrolled=len(self._enrolled),
+            proposals=len(self._proposals),
+            proposal_payload_bytes=self._proposal_payload_size,
+            blobs=len(self._blob_store),
+            blob_bytes=self._blob_store.size,
+            expire_heap_size=len(self._proposal_expire_heap),
+        )
+
+    def _add_proposal(self, proposal: _Proposal, blobs: MutableMapping[str, bytes]):
+        self._proposals[proposal.uid] = proposal
+        self._proposal_payload_size += proposal.payload_size
+        for digest in proposal.blob_digests:
+            self._blob_store.acquire(digest, blobs[digest])
+        self._schedule_proposal_expire(
+            proposal.deadline + self._proposal_retention, proposal.uid
+        )
+
+    def _remove_proposal(self, uid):
+        proposal = self._proposals.pop(uid, None)
+        if proposal is not None:
+            self._proposal_payload_size -= proposal.payload_size
+            for digest in proposal.blob_digests:
+                self._blob_store.release(digest)
+
+    def _schedule_proposal_expire(self, expire_at, uid):
+        heapq.heappush(self._proposal_expire_heap, (expire_at, uid))
+        # wake up gc loop only if the earliest deadline changed
+        if self._proposal_expire_heap[0][1] == uid:
+            self._proposal_gc_wakeup.set()
+
+    async def _proposal_gc_loop(self):
+        """
+        evict proposals whose open period and retention window passed,
+        sleeps until the earliest deadline in heap instead of scanning all proposals
+        """
+        while True:
+            self._proposal_gc_wakeup.clear()
+            if not self._proposal_expire_heap:
+                await self._proposal_gc_wakeup.wait()
+                continue
+
+            expire_at, uid = self._proposal_expire_heap[0]
+            delay = expire_at - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(
+                        self._proposal_gc_wakeup.wait(), timeout=delay
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._proposal_expire_heap)
+            proposal = self._proposals.get(uid)
+            if proposal is None:
+                continue
+            if not proposal.open_period_finished.is_set():
+                # open period overran its deadline, check again later
+                self._schedule_proposal_expire(
+                    time.time() + max(self._proposal_retention, 1), uid
+                )
+                continue
+            self._remove_proposal(uid)
+            self.debug_lazy(
+                f"proposal {uid} evicted, memory usage: {{usage}}",
+                usage=self.memory_usage,
+            )
+
+    def _unregister_party(self, party_id, task_provider: _TaskProviderForEnrolledParty):
+        """
+        remove party from all indexes, no new proposal will be dispatched to it
+        """
+        if self._enrolled.get(party_id) is not task_provider:
+            return
+        del self._enrolled[party_id]
+        for job_type in task_provider.job_types:
+            self._job_type_to_subscribes.get(job_type, set()).discard(party_id)
+
+    async def _party_liveness_loop(self):
+        """
+        evict parties whose heartbeat lost, all parties checked by this single loop
+        """
+        while True:
+            await asyncio.sleep(self._party_heartbeat_timeout / 2)
+            for party_id, task_provider in list(self._enrolled.items()):
+                if task_provider.is_asystole(self._party_heartbeat_timeout):
+                    self.warning(f"heartbeat from party {party_id} lost, evict")
+                    task_provider.close()
+                    self._unregister_party(party_id, task_provider)
 
     async def wait_for_termination(self, timeout: Optional[float] = None):
         await self._grpc_server.wait_for_termination(timeout=timeout)
@@ -120,11 +409,34 @@ class Coordinator(Logger, coordinator_pb2_grpc.CoordinatorServicer):
     async def Leave(self, request, context):
         if request.party_id not in self._enrolled:
             return coordinator_pb2.Leave.REP(status=coordinator_pb2.Leave.NOT_FOUND)
-        self._enrolled[request.party_id].closed = True
-        await self._enrolled[request.party_id].queue.join()
-        self._enrolled.__delitem__(request.party_id)
+        task_provider = self._enrolled[request.party_id]
+        task_provider.close()
+        self._unregister_party(request.party_id, task_provider)
+        await task_provider.queue.join()
         return coordinator_pb2.Leave.REP(status=coordinator_pb2.Leave.SUCCESS)
 
+    async def Heartbeat(
+        self, request: coordinator_pb2.Heartbeat.REQ, context: grpc.aio.ServicerContext
+    ) -> coordinator_pb2.Heartbeat.REP:
+        """
+        handle party heartbeat gRPC request
+
+        Args:
+            request:
+            context:
+
+        Returns:
+
+        """
+        if request.party_id not in self._enrolled:
+            return coordinator_pb2.Heartbeat.REP(
+                status=coordinator_pb2.Heartbeat.NOT_FOUND
+            )
+        self._enrolled[request.party_id].update_heartbeat(
+            request.capacity if request.HasField("capacity") else None
+        )
+        return coordinator_pb2.Heartbeat.REP(status=coordinator_pb2.Heartbeat.SUCCESS)
+
     # @stream_grpc_logging_decorator
     async def Subscribe(
         self, request: coordinator_pb2.Subscribe.REQ, context: grpc.aio.ServicerContext
@@ -150,7 +462,9 @@ class Coordinator(Logger, coordinator_pb2_grpc.CoordinatorServicer):
             )
             return
 
-        task_provider = _TaskProviderForEnrolledParty()
+        task_provider = _TaskProviderForEnrolledParty(
+            job_types=list(request.job_types), capacity=request.capacity
+        )
         self._enrolled[request.party_id] = task_provider
 
         for job_type in request.job_types:
@@ -158,32 +472,64 @@ class Coordinator(Logger, coordinator_pb2_grpc.CoordinatorServicer):
                 request.party_id
             )
 
-        while True:
-            if task_provider.closed:
-                break
-
-            try:
-                # make stop subscribe passable, check status regularly
-                proposal = await asyncio.wait_for(
-                    task_provider.queue.get(), timeout=self._check_interval
-                )
-            except asyncio.TimeoutError:
-                # not receive proposal task for a while, maybe:
-                # 1. just no new proposal
-                # 2. flag has changed to false and no new proposal will in-queue
-                continue
-            else:
-                yield coordinator_pb2.Subscribe.REP(
-                    status=coordinator_pb2.Subscribe.SUCCESS,
-                    proposal_id=proposal.uid,
-                    job_type=proposal.job_type,
+        # proposals taken from queue but not yet marked done, marked in `finally`
+        # if stream cancelled at `yield`, or `Leave` would wait on `join` forever
+        in_flight = 0
+        try:
+            while True:
+                # block until proposal arrived or provider closed, no polling here
+                proposal = await task_provider.queue.get()
+                if proposal is None:
+                    task_provider.queue.task_done()
+                    break
+
+                if not request.batch:
+                    in_flight = 1
+                    yield coordinator_pb2.Subscribe.REP(
+                        status=coordinator_pb2.Subscribe.SUCCESS,
+                        proposal_id=proposal.uid,
+                        job_type=proposal.job_type,
+                    )
+                    task_provider.queue.task_done()
+                    in_flight = 0
+                    continue
+
+                # batch mode: drain everything already queued into one frame
+                batch = [proposal]
+                closed = False
+                while not task_provider.queue.empty():
+                    proposal = task_provider.queue.get_nowait()
+                    if proposal is None:
+                        closed = True
+                        task_provider.queue.task_done()
+                        break
+                    batch.append(proposal)
+                in_flight = len(batch)
+
+                response = coordinator_pb2.Subscribe.REP(
+                    status=coordinator_pb2.Subscribe.SUCCESS
                 )
+                for proposal in batch:
+                    response.proposals.add(
+                        proposal_id=proposal.uid, job_type=proposal.job_type
+                    )
+                yield response
+                for _ in batch:
+                    task_provider.queue.task_done()
+                in_flight = 0
+                if closed:
+                    break
+        finally:
+            # reached on leave, heartbeat loss, or stream cancelled by disconnected party
+            task_provider.close()
+            self._unregister_party(request.party_id, task_provider)
+
+            for _ in range(in_flight):
+                task_provider.queue.task_done()
+            # clean proposals
+            while not task_provider.queue.empty():
+                task_provider.queue.get_nowait()
                 task_provider.queue.task_done()
-
-        # clean proposals
-        while not task_provider.queue.empty():
-            await task_provider.queue.get()
-            task_provider.queue.task_done()
 
     async def Proposal(
         self, request: coordinator_pb2.Proposal.REQ, context: grpc.aio.ServicerContext
@@ -198,10 +544,44 @@ class Coordinator(Logger, coordinator_pb2_grpc.CoordinatorServicer):
         Returns:
 
         """
+        self._metric_proposals_received.inc()
+        response = await self._handle_proposal(request)
+        self._metric_proposals.inc(
+            status=coordinator_pb2.Proposal.Status.Name(response.status)
+        )
+        return response
 
+    async def _handle_proposal(
+        self, request: coordinator_pb2.Proposal.REQ
+    ) -> coordinator_pb2.Proposal.REP:
         uid = self._generate_proposal_id(request.job_id)
+        blobs = {}
+        for blob in request.blobs:
+            if blob_digest(blob.data) != blob.digest:
+                self.info(f"digest of blob {blob.digest} mismatch, reject")
+                return coordinator_pb2.Proposal.REP(
+                    status=coordinator_pb2.Proposal.REJECT
+                )
+            blobs[blob.digest] = blob.data
         proposal = _Proposal.from_pb(uid=uid, pb=request)
-        self._proposals[uid] = proposal
+        if proposal.selection_policy:
+            policy = get_selection_policy(proposal.selection_policy)
+            if policy is None:
+                self.info(
+                    f"selection policy {proposal.selection_policy} not found, reject"
+                )
+                return coordinator_pb2.Proposal.REP(
+                    status=coordinator_pb2.Proposal.REJECT
+                )
+        else:
+            policy = self._selection_policy
+        if policy.prefers_oversubscription:
+            proposal.open_threshold = math.ceil(
+                proposal.maximum_acceptance * self._oversubscription
+            )
+        if not proposal.blob_digests.issubset(blobs):
+            self.info(f"blobs referenced by proposal {uid} not provided, reject")
+            return coordinator_pb2.Proposal.REP(status=coordinator_pb2.Proposal.REJECT)
 
         if proposal.job_type not in self._job_type_to_subscribes:
             self.info(
@@ -223,18 +603,30 @@ class Coordinator(Logger, coordinator_pb2_grpc.CoordinatorServicer):
             )
 
         # dispatch proposal
+        self._add_proposal(proposal, blobs)
         for party_id in self._job_type_to_subscribes[proposal.job_type]:
-            await self._enrolled[party_id].queue.put(proposal)
+            self._enrolled[party_id].queue.put_nowait(proposal)
 
-        # sleep until timeout and then check if there are enough responders
-        await asyncio.sleep(request.proposal_wait_time)
+        # wait until enough responders or timeout and then check if there are enough responders
+        open_period_start = time.monotonic()
+        await proposal.wait_open_period(request.proposal_wait_time)
+        self._metric_open_period.observe(time.monotonic() - open_period_start)
+        self._metric_responders.observe(len(proposal.responders))
         if not proposal.has_enough_responders():
-            proposal.set_open_period_finished(goal_reached=False)
+            proposal.set_open_period_finished(
+                goal_reached=False,
+                policy=policy,
+                capacities=self._capacities(proposal.responders),
+            )
             return coordinator_pb2.Proposal.REP(
                 status=coordinator_pb2.Proposal.NOT_ENOUGH_RESPONDERS
             )
 
-        proposal.set_open_period_finished(goal_reached=True)
+        proposal.set_open_period_finished(
+            goal_reached=True,
+            policy=policy,
+            capacities=self._capacities(proposal.responders),
+        )
         return coordinator_pb2.Proposal.REP(status=coordinator_pb2.Proposal.SUCCESS)
 
     async def FetchTask(
@@ -260,6 +652,7 @@ class Coordinator(Logger, coordinator_pb2_grpc.CoordinatorServicer):
             return coordinator_pb2.FetchTask.REP(
                 status=coordinator_pb2.FetchTask.NOT_ALLOW
             )
+        self._enrolled[request.party_id].update_heartbeat()
 
         proposal = self._proposals[request.proposal_id]
 
@@ -269,7 +662,9 @@ class Coordinator(Logger, coordinator_pb2_grpc.CoordinatorServicer):
             )
 
         proposal.add_responders(request.party_id)
+        wait_start = time.monotonic()
         await proposal.open_period_finished.wait()
+        self._metric_fetch_task_wait.observe(time.monotonic() - wait_start)
 
         if not proposal.goal_reached:
             return coordinator_pb2.FetchTask.REP(
@@ -289,6 +684,73 @@ class Coordinator(Logger, coordinator_pb2_grpc.CoordinatorServicer):
         )
         return success_rep
 
+    async def FetchTasks(
+        self, request: coordinator_pb2.FetchTasks.REQ, context: grpc.aio.ServicerContext
+    ) -> AsyncGenerator[coordinator_pb2.FetchTasks.REP, None]:
+        """
+        handle batched task fetch gRPC request, all proposals wait concurrently
+        and each response is streamed back once its open period finished
+
+        Args:
+            request:
+            context:
+
+        Returns:
+
+        """
+
+        async def _fetch(fetch_request):
+            response = await self.FetchTask(fetch_request, context)
+            return coordinator_pb2.FetchTasks.REP(
+                proposal_id=fetch_request.proposal_id, response=response
+            )
+
+        for fetched in asyncio.as_completed(
+            [_fetch(fetch_request) for fetch_request in request.requests]
+        ):
+            yield await fetched
+
+    async def FetchBlob(
+        self, request: coordinator_pb2.FetchBlob.REQ, context: grpc.aio.ServicerContext
+    ) -> AsyncGenerator[coordinator_pb2.FetchBlob.REP, None]:
+        """
+        handle blob fetch gRPC request, response blob data in chunks
+
+        Args:
+            request:
+            context:
+
+        Returns:
+
+        """
+        if request.party_id not in self._enrolled:
+            yield coordinator_pb2.FetchBlob.REP(
+                status=coordinator_pb2.FetchBlob.NOT_ALLOW
+            )
+            return
+
+        data = self._blob_store.get(request.digest)
+        if data is None:
+            yield coordinator_pb2.FetchBlob.REP(
+                status=coordinator_pb2.FetchBlob.NOT_FOUND
+            )
+            return
+
+        view = memoryview(data)
+        for start in range(0, len(view), BLOB_CHUNK_SIZE):
+            end = start + BLOB_CHUNK_SIZE
+            yield coordinator_pb2.FetchBlob.REP(
+                status=coordinator_pb2.FetchBlob.SUCCESS,
+                chunk=bytes(view[start:end]),
+            )
+
+    def _capacities(self, party_ids) -> Mapping[str, coordinator_pb2.Capacity]:
+        return {
+            party_id: self._enrolled[party_id].capacity
+            for party_id in party_ids
+            if party_id in self._enrolled
+        }
+
     def _generate_proposal_id(self, name):
         self._count_id += 1
         return f"{name}-coo_{self._count_id}"
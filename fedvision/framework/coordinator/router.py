@@ -0,0 +1,270 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+from typing import Optional, MutableMapping, List, AsyncGenerator
+
+import grpc
+
+from fedvision.framework.protobuf import coordinator_pb2_grpc, coordinator_pb2
+from fedvision.framework.utils.logger import Logger
+
+
+class _HashRing(object):
+    """
+    consistent hashing ring, adding or removing a shard only moves its own keys
+    """
+
+    def __init__(self, nodes: List[str], replicas: int = 128):
+        self._replicas = replicas
+        self._keys: List[int] = []
+        self._ring: MutableMapping[int, str] = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+    def add_node(self, node: str):
+        for i in range(self._replicas):
+            h = self._hash(f"{node}#{i}")
+            self._ring[h] = node
+            bisect.insort(self._keys, h)
+
+    def remove_node(self, node: str):
+        for i in range(self._replicas):
+            h = self._hash(f"{node}#{i}")
+            del self._ring[h]
+            self._keys.remove(h)
+
+    def get_node(self, key: str) -> str:
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._ring[self._keys[index]]
+
+
+class CoordinatorRouter(Logger, coordinator_pb2_grpc.CoordinatorServicer):
+    """
+    thin routing layer in front of coordinator shards, each shard owns a set of job types
+    """
+
+    def __init__(self, port: int, shard_addresses: List[str]):
+        """
+        init coordinator router
+
+        Args:
+            port: router serving port
+            shard_addresses: addresses of coordinator shards
+        """
+        self._grpc_port = port
+        self._grpc_server = None
+        self._shard_addresses = shard_addresses
+        self._ring = _HashRing(shard_addresses)
+        self._channels: MutableMapping[str, grpc.aio.Channel] = {}
+        self._stubs: MutableMapping[str, coordinator_pb2_grpc.CoordinatorStub] = {}
+
+    async def start(self):
+        for address in self._shard_addresses:
+            self.info(f"start channel to coordinator shard {address}")
+            channel = grpc.aio.insecure_channel(
+                address,
+                options=[
+                    ("grpc.max_send_message_length", 512 * 1024 * 1024),
+                    ("grpc.max_receive_message_length", 512 * 1024 * 1024),
+                ],
+            )
+            self._channels[address] = channel
+            self._stubs[address] = coordinator_pb2_grpc.CoordinatorStub(channel)
+
+        self.info(f"starting grpc server")
+        self._grpc_server = grpc.aio.server(
+            options=[
+                ("grpc.max_send_message_length", 512 * 1024 * 1024),
+                ("grpc.max_receive_message_length", 512 * 1024 * 1024),
+            ]
+        )
+        coordinator_pb2_grpc.add_CoordinatorServicer_to_server(self, self._grpc_server)
+        self._grpc_server.add_insecure_port(f"[::]:{self._grpc_port}")
+        await self._grpc_server.start()
+        self.info(f"grpc server started at port {self._grpc_port}")
+
+    async def stop(self):
+        self.info(f"stopping grpc server gracefully")
+        await self._grpc_server.stop(1)
+        self.info(f"grpc server stopped")
+        for channel in self._channels.values():
+            await channel.close()
+
+    async def wait_for_termination(self, timeout: Optional[float] = None):
+        await self._grpc_server.wait_for_termination(timeout=timeout)
+
+    def _shard(self, job_type) -> coordinator_pb2_grpc.CoordinatorStub:
+        return self._stubs[self._ring.get_node(job_type)]
+
+    async def Subscribe(
+        self, request: coordinator_pb2.Subscribe.REQ, context: grpc.aio.ServicerContext
+    ) -> AsyncGenerator[coordinator_pb2.Subscribe.REP, None]:
+        """
+        split subscription by shard owning each job type and merge the streams
+        """
+        job_types_by_shard: MutableMapping[str, List[str]] = {}
+        for job_type in request.job_types:
+            job_types_by_shard.setdefault(self._ring.get_node(job_type), []).append(
+                job_type
+            )
+
+        merged: asyncio.Queue[Optional[coordinator_pb2.Subscribe.REP]] = asyncio.Queue()
+
+        async def _forward(address, job_types):
+            shard_request = coordinator_pb2.Subscribe.REQ()
+            shard_request.CopyFrom(request)
+            del shard_request.job_types[:]
+            shard_request.job_types.extend(job_types)
+            try:
+                async for response in self._stubs[address].Subscribe(shard_request):
+                    await merged.put(response)
+            except grpc.aio.AioRpcError as e:
+                self.error(f"subscribe stream from shard {address} broken: {e}")
+            finally:
+                await merged.put(None)
+
+        forwarders = [
+            asyncio.create_task(_forward(address, job_types))
+            for address, job_types in job_types_by_shard.items()
+        ]
+        try:
+            num_running = len(forwarders)
+            while num_running > 0:
+                response = await merged.get()
+                if response is None:
+                    num_running -= 1
+                    continue
+                yield response
+                if response.status != coordinator_pb2.Subscribe.SUCCESS:
+                    break
+        finally:
+            for forwarder in forwarders:
+                forwarder.cancel()
+
+    async def Proposal(
+        self, request: coordinator_pb2.Proposal.REQ, context: grpc.aio.ServicerContext
+    ) -> coordinator_pb2.Proposal.REP:
+        return await self._shard(request.job_type).Proposal(request)
+
+    async def FetchTask(
+        self, request: coordinator_pb2.FetchTask.REQ, context: grpc.aio.ServicerContext
+    ) -> coordinator_pb2.FetchTask.REP:
+        return await self._shard(request.job_type).FetchTask(request)
+
+    async def FetchTasks(
+        self, request: coordinator_pb2.FetchTasks.REQ, context: grpc.aio.ServicerContext
+    ) -> AsyncGenerator[coordinator_pb2.FetchTasks.REP, None]:
+        # one sub-batch per shard, responses merged as they arrive
+        requests_by_shard: MutableMapping[str, coordinator_pb2.FetchTasks.REQ] = {}
+        for fetch_request in request.requests:
+            address = self._ring.get_node(fetch_request.job_type)
+            if address not in requests_by_shard:
+                requests_by_shard[address] = coordinator_pb2.FetchTasks.REQ(
+                    party_id=request.party_id
+                )
+            requests_by_shard[address].requests.append(fetch_request)
+
+        merged: asyncio.Queue[Optional[coordinator_pb2.FetchTasks.REP]] = (
+            asyncio.Queue()
+        )
+
+        async def _forward(address, shard_request):
+            answered = set()
+            try:
+                async for response in self._stubs[address].FetchTasks(shard_request):
+                    answered.add(response.proposal_id)
+                    await merged.put(response)
+            except grpc.aio.AioRpcError as e:
+                self.error(f"fetch tasks stream from shard {address} broken: {e}")
+                # proposals not answered by shard are lost to this party
+                for fetch_request in shard_request.requests:
+                    if fetch_request.proposal_id not in answered:
+                        await merged.put(
+                            coordinator_pb2.FetchTasks.REP(
+                                proposal_id=fetch_request.proposal_id,
+                                response=coordinator_pb2.FetchTask.REP(
+                                    status=coordinator_pb2.FetchTask.CANCELED
+                                ),
+                            )
+                        )
+            finally:
+                await merged.put(None)
+
+        forwarders = [
+            asyncio.create_task(_forward(address, shard_request))
+            for address, shard_request in requests_by_shard.items()
+        ]
+        try:
+            num_running = len(forwarders)
+            while num_running > 0:
+                response = await merged.get()
+                if response is None:
+                    num_running -= 1
+                    continue
+                yield response
+        finally:
+            for forwarder in forwarders:
+                forwarder.cancel()
+
+    async def FetchBlob(
+        self, request: coordinator_pb2.FetchBlob.REQ, context: grpc.aio.ServicerContext
+    ) -> AsyncGenerator[coordinator_pb2.FetchBlob.REP, None]:
+        async for response in self._shard(request.job_type).FetchBlob(request):
+            yield response
+
+    async def _broadcast(self, method: str, request) -> list:
+        """
+        call `method` on every shard, shards failed are logged and left out
+        """
+        addresses = list(self._stubs)
+        results = await asyncio.gather(
+            *[getattr(self._stubs[address], method)(request) for address in addresses],
+            return_exceptions=True,
+        )
+        responses = []
+        for address, result in zip(addresses, results):
+            if isinstance(result, grpc.aio.AioRpcError):
+                self.error(f"{method} to shard {address} failed: {result}")
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                responses.append(result)
+        return responses
+
+    async def Leave(
+        self, request: coordinator_pb2.Leave.REQ, context: grpc.aio.ServicerContext
+    ) -> coordinator_pb2.Leave.REP:
+        responses = await self._broadcast("Leave", request)
+        if any(r.status == coordinator_pb2.Leave.SUCCESS for r in responses):
+            return coordinator_pb2.Leave.REP(status=coordinator_pb2.Leave.SUCCESS)
+        return coordinator_pb2.Leave.REP(status=coordinator_pb2.Leave.NOT_FOUND)
+
+    async def Heartbeat(
+        self, request: coordinator_pb2.Heartbeat.REQ, context: grpc.aio.ServicerContext
+    ) -> coordinator_pb2.Heartbeat.REP:
+        responses = await self._broadcast("Heartbeat", request)
+        if any(r.status == coordinator_pb2.Heartbeat.SUCCESS for r in responses):
+            return coordinator_pb2.Heartbeat.REP(
+                status=coordinator_pb2.Heartbeat.SUCCESS
+            )
+        return coordinator_pb2.Heartbeat.REP(status=coordinator_pb2.Heartbeat.NOT_FOUND)
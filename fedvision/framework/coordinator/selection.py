@@ -0,0 +1,104 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import abc
+import random
+from typing import List, Mapping, MutableMapping, Optional, Type
+
+from fedvision.framework.protobuf import coordinator_pb2
+
+
+class SelectionPolicy(metaclass=abc.ABCMeta):
+    """
+    choose participants of a proposal from its responders, without replacement
+    """
+
+    name: str
+
+    # whether policy benefits from more responders than it chooses, the open
+    # period of such a proposal lasts until responders over-subscribe it
+    prefers_oversubscription: bool = True
+
+    @abc.abstractmethod
+    def select(
+        self,
+        responders: List[str],
+        capacities: Mapping[str, coordinator_pb2.Capacity],
+        k: int,
+    ) -> List[str]:
+        ...
+
+
+class UniformSelection(SelectionPolicy):
+    """
+    uniformly random
+    """
+
+    name = "uniform"
+    prefers_oversubscription = False
+
+    def select(self, responders, capacities, k):
+        return random.sample(responders, min(k, len(responders)))
+
+
+class CapacityWeightedSelection(SelectionPolicy):
+    """
+    weighted random by free workers times dataset size (each at least 1)
+    """
+
+    name = "capacity_weighted"
+
+    def select(self, responders, capacities, k):
+        def _key(party_id):
+            capacity = capacities.get(party_id, coordinator_pb2.Capacity())
+            weight = max(capacity.free_workers, 1) * max(capacity.dataset_size, 1)
+            # weighted sampling without replacement (Efraimidis-Spirakis)
+            return random.random() ** (1.0 / weight)
+
+        return sorted(responders, key=_key, reverse=True)[:k]
+
+
+class FastestSelection(SelectionPolicy):
+    """
+    parties with smallest recent round time, parties never reported go last
+    """
+
+    name = "fastest"
+
+    def select(self, responders, capacities, k):
+        def _key(party_id):
+            capacity = capacities.get(party_id, coordinator_pb2.Capacity())
+            round_time = capacity.recent_round_time
+            return round_time if round_time > 0 else float("inf"), random.random()
+
+        return sorted(responders, key=_key)[:k]
+
+
+_policies: MutableMapping[str, Type[SelectionPolicy]] = {}
+
+
+def register_selection_policy(policy_cls: Type[SelectionPolicy]):
+    _policies[policy_cls.name] = policy_cls
+    return policy_cls
+
+
+def get_selection_policy(name) -> Optional[SelectionPolicy]:
+    policy_cls = _policies.get(name)
+    if policy_cls is None:
+        return None
+    return policy_cls()
+
+
+for _policy_cls in [UniformSelection, CapacityWeightedSelection, FastestSelection]:
+    register_selection_policy(_policy_cls)
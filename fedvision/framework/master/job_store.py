@@ -0,0 +1,311 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+job status storage of master.
+
+Stores behave like a mapping from job id to `_JobStatus` (so
+`shared_status.job_status[job_id] = status` keeps working), plus paginated
+listing by status and compaction of finished jobs older than retention.
+"""
+
+import abc
+import enum
+import os
+import sqlite3
+import time
+from typing import Callable, List, MutableMapping, Optional, Sequence
+
+import attr
+
+
+class _JobStatus(enum.Enum):
+    """
+    query job status
+    """
+
+    NOTFOUND = "not_found"
+    WAITING = "waiting"
+    PROPOSAL = "proposal"
+    RUNNING = "running"
+    FAILED = "failed"
+    SUCCESS = "success"
+
+
+FINISHED_STATUS = (_JobStatus.FAILED, _JobStatus.SUCCESS)
+
+
+@attr.s(slots=True)
+class JobRecord(object):
+    seq = attr.ib(type=int)
+    job_id = attr.ib(type=str)
+    status = attr.ib(type=_JobStatus)
+    submit_time = attr.ib(type=float)
+    update_time = attr.ib(type=float)
+
+    def to_dict(self):
+        return dict(
+            job_id=self.job_id,
+            status=str(self.status),
+            submit_time=self.submit_time,
+            update_time=self.update_time,
+        )
+
+
+class JobStore(metaclass=abc.ABCMeta):
+    """
+    mapping from job id to status, ordered by submit sequence
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[str, _JobStatus], None]] = []
+
+    def add_listener(self, listener: Callable[[str, _JobStatus], None]):
+        """
+        call `listener(job_id, status)` after each status set through `store[job_id] = status`
+        """
+        self._listeners.append(listener)
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        ...
+
+    @abc.abstractmethod
+    def set_status(self, job_id: str, status: _JobStatus):
+        """
+        insert job with `status` or update status of existing job
+        """
+        ...
+
+    @abc.abstractmethod
+    def list_jobs(
+        self,
+        status: Sequence[_JobStatus] = (),
+        limit: int = 50,
+        before: Optional[int] = None,
+    ) -> List[JobRecord]:
+        """
+        jobs newest first
+
+        Args:
+            status: only jobs in these status, all jobs if empty
+            limit: max number of jobs returned
+            before: only jobs with seq less than this (`seq` of last job of previous page)
+        """
+        ...
+
+    @abc.abstractmethod
+    def compact(self, retention: float) -> int:
+        """
+        drop finished jobs not updated for `retention` seconds
+
+        Returns:
+            number of jobs dropped
+        """
+        ...
+
+    @abc.abstractmethod
+    def fail_unfinished(self) -> int:
+        """
+        mark jobs left unfinished by previous run as failed
+
+        Returns:
+            number of jobs marked
+        """
+        ...
+
+    def close(self):
+        pass
+
+    def __getitem__(self, job_id) -> _JobStatus:
+        record = self.get(job_id)
+        if record is None:
+            raise KeyError(job_id)
+        return record.status
+
+    def __setitem__(self, job_id, status: _JobStatus):
+        self.set_status(job_id, status)
+        for listener in self._listeners:
+            listener(job_id, status)
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+
+class MemoryJobStore(JobStore):
+    """
+    in memory store, lost on restart
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._seq = 0
+        self._records: MutableMapping[str, JobRecord] = {}
+
+    def get(self, job_id):
+        return self._records.get(job_id)
+
+    def set_status(self, job_id, status):
+        now = time.time()
+        record = self._records.get(job_id)
+        if record is None:
+            self._seq += 1
+            self._records[job_id] = JobRecord(
+                seq=self._seq,
+                job_id=job_id,
+                status=status,
+                submit_time=now,
+                update_time=now,
+            )
+        else:
+            record.status = status
+            record.update_time = now
+
+    def list_jobs(self, status=(), limit=50, before=None):
+        jobs = []
+        # dict keeps insertion order, which is seq order
+        for record in reversed(list(self._records.values())):
+            if before is not None and record.seq >= before:
+                continue
+            if status and record.status not in status:
+                continue
+            jobs.append(record)
+            if len(jobs) >= limit:
+                break
+        return jobs
+
+    def compact(self, retention):
+        deadline = time.time() - retention
+        expired = [
+            job_id
+            for job_id, record in self._records.items()
+            if record.status in FINISHED_STATUS and record.update_time < deadline
+        ]
+        for job_id in expired:
+            del self._records[job_id]
+        return len(expired)
+
+    def fail_unfinished(self):
+        return 0
+
+
+class SQLiteJobStore(JobStore):
+    """
+    sqlite backed store, indexed by job id, status and submit sequence
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._path = path
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                submit_time REAL NOT NULL,
+                update_time REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status_seq ON jobs (status, seq);
+            CREATE INDEX IF NOT EXISTS jobs_submit_time ON jobs (submit_time);
+            """
+        )
+
+    @staticmethod
+    def _record(row) -> JobRecord:
+        seq, job_id, status, submit_time, update_time = row
+        return JobRecord(
+            seq=seq,
+            job_id=job_id,
+            status=_JobStatus(status),
+            submit_time=submit_time,
+            update_time=update_time,
+        )
+
+    def get(self, job_id):
+        row = self._conn.execute(
+            "SELECT seq, job_id, status, submit_time, update_time FROM jobs WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()
+        return None if row is None else self._record(row)
+
+    def set_status(self, job_id, status):
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = ?, update_time = ? WHERE job_id = ?",
+            (status.value, now, job_id),
+        )
+        if cursor.rowcount == 0:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, submit_time, update_time) VALUES (?, ?, ?, ?)",
+                (job_id, status.value, now, now),
+            )
+
+    def list_jobs(self, status=(), limit=50, before=None):
+        conditions = []
+        params = []
+        if status:
+            conditions.append(f"status IN ({','.join('?' * len(status))})")
+            params.extend(s.value for s in status)
+        if before is not None:
+            conditions.append("seq < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._conn.execute(
+            f"SELECT seq, job_id, status, submit_time, update_time FROM jobs {where} "
+            f"ORDER BY seq DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def compact(self, retention):
+        cursor = self._conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND update_time < ?",
+            (*(s.value for s in FINISHED_STATUS), time.time() - retention),
+        )
+        if cursor.rowcount > 0:
+            self._conn.execute("PRAGMA incremental_vacuum")
+        return cursor.rowcount
+
+    def fail_unfinished(self):
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = ?, update_time = ? WHERE status NOT IN (?, ?)",
+            (
+                _JobStatus.FAILED.value,
+                time.time(),
+                *(s.value for s in FINISHED_STATUS),
+            ),
+        )
+        return cursor.rowcount
+
+    def close(self):
+        self._conn.close()
+
+
+def create_job_store(path: str) -> JobStore:
+    """
+    create job store
+
+    Args:
+        path: sqlite database path, or `memory` for a non-persistent store
+    """
+    if path == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(path)
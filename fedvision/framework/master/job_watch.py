@@ -0,0 +1,115 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+job status change notification.
+
+Every status transition gets a process wide, increasing version. Watchers wait
+on the jobs they follow only, and are woken by the transition itself instead of
+polling the job store.
+"""
+
+import asyncio
+import collections
+import time
+from typing import Iterable, List, MutableMapping, Set
+
+import attr
+
+from fedvision.framework.master.job_store import _JobStatus
+
+
+@attr.s(slots=True)
+class JobEvent(object):
+    version = attr.ib(type=int)
+    job_id = attr.ib(type=str)
+    status = attr.ib(type=_JobStatus)
+    time = attr.ib(type=float)
+
+    def to_dict(self):
+        return dict(
+            version=self.version,
+            job_id=self.job_id,
+            status=str(self.status),
+            time=self.time,
+        )
+
+
+class JobStatusNotifier(object):
+    """
+    keeps recent transitions of recent jobs and wakes watchers on change
+    """
+
+    def __init__(self, max_jobs: int = 10000):
+        self.version = 0
+        self._max_jobs = max_jobs
+        self._history: MutableMapping[str, List[JobEvent]] = collections.OrderedDict()
+        self._waiters: MutableMapping[str, Set[asyncio.Future]] = {}
+
+    def publish(self, job_id: str, status: _JobStatus):
+        self.version += 1
+        event = JobEvent(
+            version=self.version, job_id=job_id, status=status, time=time.time()
+        )
+        history = self._history.get(job_id)
+        if history is None:
+            history = self._history[job_id] = []
+            if len(self._history) > self._max_jobs:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(job_id)
+        history.append(event)
+
+        for waiter in self._waiters.pop(job_id, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def events(self, job_ids: Iterable[str], since: int) -> List[JobEvent]:
+        """
+        transitions of `job_ids` with version greater than `since`, oldest first
+        """
+        events = []
+        for job_id in job_ids:
+            for event in self._history.get(job_id, ()):
+                if event.version > since:
+                    events.append(event)
+        events.sort(key=lambda e: e.version)
+        return events
+
+    async def wait(
+        self, job_ids: List[str], since: int, timeout: float
+    ) -> List[JobEvent]:
+        """
+        wait until any of `job_ids` changes after version `since`, or timeout
+
+        Returns:
+            transitions after `since`, empty if timeout
+        """
+        events = self.events(job_ids, since)
+        if events or timeout <= 0:
+            return events
+
+        waiter = asyncio.get_event_loop().create_future()
+        for job_id in job_ids:
+            self._waiters.setdefault(job_id, set()).add(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        finally:
+            for job_id in job_ids:
+                waiters = self._waiters.get(job_id)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[job_id]
+        return self.events(job_ids, since)
@@ -15,11 +15,13 @@
 from __future__ import annotations
 
 import asyncio
-import enum
+import heapq
+import itertools
 import json
+import time
 import traceback
 from datetime import datetime
-from typing import Optional, MutableMapping, List
+from typing import Callable, MutableMapping, Optional, List, Set
 
 import attr
 import grpc
@@ -27,6 +29,12 @@ from aiohttp import web
 
 from fedvision.framework import extensions
 from fedvision.framework.abc.job import Job
+from fedvision.framework.master.job_store import (
+    _JobStatus,
+    create_job_store,
+    FINISHED_STATUS,
+)
+from fedvision.framework.master.job_watch import JobStatusNotifier
 from fedvision.framework.protobuf import (
     coordinator_pb2_grpc,
     coordinator_pb2,
@@ -34,21 +42,73 @@ from fedvision.framework.protobuf import (
     cluster_pb2,
     cluster_pb2_grpc,
 )
-from fedvision.framework.utils.exception import FedvisionExtensionException
+from fedvision.framework.utils.blob import extract_blobs, resolve_blobs
+from fedvision.framework.utils.exception import (
+    FedvisionExtensionException,
+    FedvisionException,
+)
 from fedvision.framework.utils.logger import Logger
+from fedvision.framework.utils.tracing import JobTracer, load_spans, summarize_spans
 
 
-class _JobStatus(enum.Enum):
+class _PendingJobQueue(object):
     """
-    query job status
+    submitted jobs waiting for admission, higher priority first, fifo within
+    the same priority. jobs of a batch submit are queued as one group and
+    admitted together
     """
 
-    NOTFOUND = "not_found"
-    WAITING = "waiting"
-    PROPOSAL = "proposal"
-    RUNNING = "running"
-    FAILED = "failed"
-    SUCCESS = "success"
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._heap = []
+        self._num_jobs = 0
+        self._counter = itertools.count()
+        self._not_empty = asyncio.Event()
+
+    def __len__(self):
+        return self._num_jobs
+
+    def full(self):
+        return self._num_jobs >= self.maxsize
+
+    def put_nowait(self, job: Job) -> int:
+        """
+        enqueue job
+
+        Returns:
+            position of job in queue, 0 is the next to admit
+
+        Raises:
+            asyncio.QueueFull: too many jobs pending
+        """
+        return self.put_group_nowait([job])
+
+    def put_group_nowait(self, jobs: List[Job]) -> int:
+        """
+        enqueue jobs as one group, at priority of the first job
+
+        Returns:
+            position of group in queue, 0 is the next to admit
+
+        Raises:
+            asyncio.QueueFull: too many jobs pending
+        """
+        if self._num_jobs + len(jobs) > self.maxsize:
+            raise asyncio.QueueFull()
+        key = (-jobs[0].priority, next(self._counter))
+        position = sum(1 for item in self._heap if item[:2] < key)
+        heapq.heappush(self._heap, (*key, jobs))
+        self._num_jobs += len(jobs)
+        self._not_empty.set()
+        return position
+
+    async def get(self) -> List[Job]:
+        while not self._heap:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        jobs = heapq.heappop(self._heap)[2]
+        self._num_jobs -= len(jobs)
+        return jobs
 
 
 @attr.s
@@ -59,12 +119,20 @@ class _SharedStatus(object):
 
     party_id = attr.ib(type=str)
     job_types = attr.ib(type=List[str], default=["paddle_fl", "dummy"])
+    job_store_path = attr.ib(type=str, default="memory")
+    max_pending_jobs = attr.ib(type=int, default=100)
 
     def __attrs_post_init__(self):
-        self.job_status: MutableMapping[str, _JobStatus] = {}
+        # job id -> status, persisted unless job store is `memory`
+        self.job_status = create_job_store(self.job_store_path)
+        # wakes `/watch` requests on status transitions
+        self.job_notifier = JobStatusNotifier()
+        self.job_status.add_listener(self.job_notifier.publish)
         self.cluster_task_queue: asyncio.Queue[job_pb2.Task] = asyncio.Queue()
-        self.job_queue: asyncio.Queue[Job] = asyncio.Queue()
+        self.job_queue = _PendingJobQueue(maxsize=self.max_pending_jobs)
         self.job_counter = 0
+        # advertised to coordinator on subscribe and heartbeat
+        self.capacity = coordinator_pb2.Capacity()
 
     def generate_job_id(self):
         """
@@ -98,6 +166,7 @@ class CoordinatorConnect(Logger):
         self.address = address
         self.shared_status = shared_status
         self.accept_rule = ProposalAcceptRule(self.shared_status)
+        self._heartbeat_interval = 5
 
         self._channel = None
         self._stub = None
@@ -106,33 +175,99 @@ class CoordinatorConnect(Logger):
         """
         start subscribe to coordinator and accept `proposals`
         """
-        request = coordinator_pb2.Subscribe.REQ(party_id=self.shared_status.party_id)
+        request = coordinator_pb2.Subscribe.REQ(
+            party_id=self.shared_status.party_id,
+            capacity=self.shared_status.capacity,
+            batch=True,
+        )
         for job_type in self.shared_status.job_types:
             request.job_types.append(job_type)
         async for response in self._stub.Subscribe(request):
             if response.status != coordinator_pb2.Subscribe.SUCCESS:
                 return
-            if not await self.accept_rule.accept(response.job_type):
-                return
 
-            async def _acceptor():
-                # accept all
-                fetch_response = await self._stub.FetchTask(
-                    coordinator_pb2.FetchTask.REQ(
+            # proposals packed in one frame in batch mode, single proposal otherwise
+            proposals = [
+                (proposal.proposal_id, proposal.job_type)
+                for proposal in response.proposals
+            ]
+            if not proposals:
+                proposals = [(response.proposal_id, response.job_type)]
+
+            accepted = []
+            for proposal_id, job_type in proposals:
+                if await self.accept_rule.accept(job_type):
+                    accepted.append((proposal_id, job_type))
+            if accepted:
+                asyncio.create_task(self._acceptor(accepted))
+
+    async def _acceptor(self, proposals):
+        """
+        fetch tasks of accepted proposals in one batched request, tasks are
+        streamed back one by one as soon as each proposal is ready
+
+        Args:
+            proposals: list of (proposal_id, job_type)
+        """
+        fetch_request = coordinator_pb2.FetchTasks.REQ(
+            party_id=self.shared_status.party_id
+        )
+        for proposal_id, job_type in proposals:
+            fetch_request.requests.add(
+                party_id=self.shared_status.party_id,
+                proposal_id=proposal_id,
+                job_type=job_type,
+            )
+        job_types = dict(proposals)
+        async for fetched in self._stub.FetchTasks(fetch_request):
+            proposal_id = fetched.proposal_id
+            job_type = job_types[proposal_id]
+            fetch_response = fetched.response
+            if fetch_response.status != coordinator_pb2.FetchTask.READY:
+                self.debug(f"proposal {proposal_id} not ready: {fetch_response.status}")
+                continue
+
+            # resolve payloads referenced by task, failures only drop this proposal
+            task = fetch_response.task
+            try:
+                if task.blob_refs:
+                    # message type of packed task registered by module of task class
+                    if extensions.get_task_class(task.task_type) is None:
+                        raise FedvisionExtensionException(
+                            f"task type {task.task_type} not found"
+                        )
+                    blobs = {}
+                    for digest in set(task.blob_refs.values()):
+                        blobs[digest] = await self.fetch_blob(digest, job_type)
+                    resolve_blobs(task, blobs)
+            except (FedvisionException, grpc.aio.AioRpcError) as e:
+                self.error(f"proposal {proposal_id} resolve failed: {e}")
+                continue
+            except Exception as e:
+                self.exception(f"proposal {proposal_id} resolve failed: {e}")
+                continue
+
+            # put task in cluster task queue
+            await self.shared_status.cluster_task_queue.put(task)
+
+    async def heartbeat(self):
+        """
+        infinity loop to send heartbeat to coordinator, keep subscription alive
+        """
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            try:
+                response = await self._stub.Heartbeat(
+                    coordinator_pb2.Heartbeat.REQ(
                         party_id=self.shared_status.party_id,
-                        proposal_id=response.proposal_id,
+                        capacity=self.shared_status.capacity,
                     )
                 )
-                if fetch_response.status != coordinator_pb2.FetchTask.READY:
-                    self.debug(
-                        f"proposal {response.proposal_id} not ready: {fetch_response.status}"
-                    )
-                    return
-
-                # put task in cluster task queue
-                await self.shared_status.cluster_task_queue.put(fetch_response.task)
-
-            asyncio.create_task(_acceptor())
+            except grpc.aio.AioRpcError as e:
+                self.error(f"can't send heartbeat to coordinator, {e}")
+                continue
+            if response.status != coordinator_pb2.Heartbeat.SUCCESS:
+                self.warning(f"heartbeat rejected by coordinator: {response.status}")
 
     async def make_proposal(
         self, request: coordinator_pb2.Proposal.REQ
@@ -147,8 +282,39 @@ class CoordinatorConnect(Logger):
              response
 
         """
+        # send each distinct payload once, tasks refer to them by digest
+        blobs = {}
+        for task in request.tasks:
+            extract_blobs(task, blobs)
+        for digest, data in blobs.items():
+            request.blobs.add(digest=digest, data=data)
         return await self._stub.Proposal(request)
 
+    async def fetch_blob(self, digest: str, job_type: str) -> bytes:
+        """
+        fetch blob from coordinator
+        Args:
+            digest:
+                digest of blob
+            job_type:
+                job type of proposal referencing blob
+
+        Returns:
+            blob data
+        """
+        chunks = []
+        async for response in self._stub.FetchBlob(
+            coordinator_pb2.FetchBlob.REQ(
+                party_id=self.shared_status.party_id, digest=digest, job_type=job_type
+            )
+        ):
+            if response.status != coordinator_pb2.FetchBlob.SUCCESS:
+                raise FedvisionException(
+                    f"fetch blob {digest} failed: {response.status}"
+                )
+            chunks.append(response.chunk)
+        return b"".join(chunks)
+
     async def leave(self):
         """
         disconnect with coordinator
@@ -243,6 +409,10 @@ class RESTService(Logger):
 
             1. submitter
             2. query
+            3. batch submitter
+            4. jobs
+            5. watch
+            6. timing
         Args:
             route_table: optional provide a `RouteTableDef` instance.
 
@@ -252,7 +422,11 @@ class RESTService(Logger):
         if route_table is None:
             route_table = web.RouteTableDef()
         route_table.post("/submit")(self._restful_submit)
+        route_table.post("/submit_batch")(self._restful_submit_batch)
         route_table.post("/query")(self._restful_query)
+        route_table.get("/jobs")(self._restful_jobs)
+        route_table.get("/watch")(self._restful_watch)
+        route_table.get("/timing")(self._restful_timing)
         return route_table
 
     async def _restful_submit(self, request: web.Request) -> web.Response:
@@ -273,33 +447,147 @@ class RESTService(Logger):
             job_type = data["job_type"]
             job_config = data["job_config"]
             algorithm_config = data.get("algorithm_config", None)
-        except KeyError:
+            priority = int(data.get("priority", 0))
+        except (KeyError, ValueError):
             return web.json_response(
                 data=dict(exception=traceback.format_exc()), status=400
             )
 
+        # backpressure before any work done for this job
+        job_queue = self.shared_status.job_queue
+        if job_queue.full():
+            return self._too_many_pending()
+
         # noinspection PyBroadException
         try:
-            loader = extensions.get_job_class(job_type)
-            validator = extensions.get_job_schema_validator(job_type)
-            if loader is None:
-                raise FedvisionExtensionException(f"job type {job_type} not supported")
-            validator.validate(job_config)
-            job_id = self.shared_status.generate_job_id()
-            job = loader.load(
-                job_id=job_id, config=job_config, algorithm_config=algorithm_config
-            )
-
+            job = self._load_job(job_type, job_config, algorithm_config)
+            job_id = job.job_id
         except Exception:
             # self.logger.exception("[submit]catch exception")
             reason = traceback.format_exc()
             return web.json_response(data=dict(exception=reason), status=400)
 
+        try:
+            job.priority = priority
+            position = job_queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return self._too_many_pending()
         self.shared_status.job_status[job_id] = _JobStatus.WAITING
-        await self.shared_status.job_queue.put(job)
 
         return web.json_response(
-            data={"job_id": job_id},
+            data={"job_id": job_id, "position": position},
+        )
+
+    async def _restful_submit_batch(self, request: web.Request) -> web.Response:
+        """
+        handle batch submit request, a sweep of jobs sharing the same base config
+
+        request:
+
+            job_type, priority: same as submit
+            job_config: base job config
+            algorithm_config: algorithm config, or list of algorithm configs to sweep
+            sweep: job config key -> list of values, jobs submitted for every combination
+
+        jobs are queued as one group and all or none are accepted. the group is
+        admitted as a unit: compiled once per distinct model graph, then fanned
+        out to run as separate jobs.
+
+        Args:
+            request:
+
+        Returns:
+
+        """
+        try:
+            data = await request.json()
+        except json.JSONDecodeError as e:
+            return web.json_response(data={}, status=400, reason=str(e))
+
+        try:
+            job_type = data["job_type"]
+            base_config = data["job_config"]
+            algorithm_configs = data.get("algorithm_config", None)
+            if not isinstance(algorithm_configs, list):
+                algorithm_configs = [algorithm_configs]
+            sweep = data.get("sweep", {})
+            priority = int(data.get("priority", 0))
+            keys = sorted(sweep)
+            if any(not isinstance(sweep[key], list) for key in keys):
+                raise ValueError("sweep values should be lists")
+            job_configs = [
+                {**base_config, **dict(zip(keys, values))}
+                for values in itertools.product(*(sweep[key] for key in keys))
+            ]
+        except (KeyError, ValueError, TypeError):
+            return web.json_response(
+                data=dict(exception=traceback.format_exc()), status=400
+            )
+
+        num_jobs = len(job_configs) * len(algorithm_configs)
+        if num_jobs == 0:
+            return web.json_response(
+                data=dict(exception="no job in sweep"), status=400
+            )
+        job_queue = self.shared_status.job_queue
+        if num_jobs > job_queue.maxsize:
+            # never admitted however long client retries
+            return web.json_response(
+                data=dict(
+                    exception=f"sweep of {num_jobs} jobs exceeds max pending jobs",
+                    max_pending=job_queue.maxsize,
+                ),
+                status=413,
+            )
+        if len(job_queue) + num_jobs > job_queue.maxsize:
+            return self._too_many_pending()
+
+        jobs = []
+        # noinspection PyBroadException
+        try:
+            for algorithm_config in algorithm_configs:
+                for job_config in job_configs:
+                    jobs.append(self._load_job(job_type, job_config, algorithm_config))
+        except Exception:
+            reason = traceback.format_exc()
+            return web.json_response(
+                data=dict(exception=reason, index=len(jobs)), status=400
+            )
+
+        for job in jobs:
+            job.priority = priority
+        position = job_queue.put_group_nowait(jobs)
+        for job in jobs:
+            self.shared_status.job_status[job.job_id] = _JobStatus.WAITING
+
+        return web.json_response(
+            data={
+                "job_ids": [job.job_id for job in jobs],
+                "positions": [position] * len(jobs),
+            },
+        )
+
+    def _load_job(self, job_type, job_config, algorithm_config) -> Job:
+        loader = extensions.get_job_class(job_type)
+        validator = extensions.get_job_schema_validator(job_type)
+        if loader is None:
+            raise FedvisionExtensionException(f"job type {job_type} not supported")
+        validator.validate(job_config)
+        job_id = self.shared_status.generate_job_id()
+        return loader.load(
+            job_id=job_id, config=job_config, algorithm_config=algorithm_config
+        )
+
+    def _too_many_pending(self) -> web.Response:
+        job_queue = self.shared_status.job_queue
+        return web.json_response(
+            data=dict(
+                exception="too many pending jobs",
+                position=len(job_queue),
+                max_pending=job_queue.maxsize,
+            ),
+            status=429,
+            headers={"Retry-After": "10"},
         )
 
     async def _restful_query(self, request: web.Request) -> web.Response:
@@ -331,37 +619,257 @@ class RESTService(Logger):
             data=dict(job_id=job_id, status=str(self.shared_status.job_status[job_id])),
         )
 
+    async def _restful_jobs(self, request: web.Request) -> web.Response:
+        """
+        handle jobs listing request, newest first
+
+        query parameters:
+
+            status: repeatable, filter by status (`waiting`, `running`, ...)
+            limit: page size, 1 to 1000
+            before: `next` returned by previous page
+
+        Args:
+            request:
+
+        Returns:
+
+        """
+        try:
+            status = [
+                _JobStatus(s.lower()) for s in request.query.getall("status", [])
+            ]
+            limit = int(request.query.get("limit", 50))
+            if not 1 <= limit <= 1000:
+                raise ValueError(f"limit should be in [1, 1000], got {limit}")
+            before = request.query.get("before", None)
+            before = int(before) if before is not None else None
+        except ValueError as e:
+            return web.json_response(data={}, status=400, reason=str(e))
+
+        records = self.shared_status.job_status.list_jobs(
+            status=status, limit=limit, before=before
+        )
+        return web.json_response(
+            data=dict(
+                jobs=[record.to_dict() for record in records],
+                next=records[-1].seq if len(records) == limit else None,
+            )
+        )
+
+    async def _restful_watch(self, request: web.Request) -> web.StreamResponse:
+        """
+        handle watch request, follow status transitions of jobs
+
+        query parameters:
+
+            job_id: repeatable, jobs to watch
+            since: version of last event seen, omit to get current status first
+            timeout: long-poll seconds to wait for a transition, positive, at most 300
+
+        Responds with server-sent events streamed until all jobs finished if
+        `Accept: text/event-stream` (`Last-Event-ID` used as `since`), otherwise
+        with json `{"events": [...], "version": ...}` as soon as any job changes
+        after `since` or timeout.
+
+        Args:
+            request:
+
+        Returns:
+
+        """
+        job_ids = request.query.getall("job_id", [])
+        if not job_ids:
+            return web.json_response(data={}, status=400, reason="required `job_id`")
+        try:
+            since = request.query.get("since", request.headers.get("Last-Event-ID"))
+            since = int(since) if since is not None else None
+            timeout = float(request.query.get("timeout", 30))
+            # also rejects nan, a zero wait would spin the stream loop
+            if not timeout > 0:
+                raise ValueError(f"timeout should be positive, got {timeout}")
+            timeout = min(timeout, 300)
+        except ValueError as e:
+            return web.json_response(data={}, status=400, reason=str(e))
+
+        not_found = [
+            job_id for job_id in job_ids if job_id not in self.shared_status.job_status
+        ]
+        if not_found:
+            return web.json_response(
+                data=dict(job_ids=not_found, status=str(_JobStatus.NOTFOUND)),
+                status=404,
+            )
+
+        notifier = self.shared_status.job_notifier
+        if since is None:
+            # current status as events, read with version in the same tick
+            since = notifier.version
+            events = [
+                dict(
+                    version=since,
+                    job_id=job_id,
+                    status=str(self.shared_status.job_status[job_id]),
+                    time=time.time(),
+                )
+                for job_id in job_ids
+            ]
+        else:
+            events = None
+
+        if "text/event-stream" not in request.headers.get("Accept", ""):
+            if events is None:
+                events = [
+                    event.to_dict()
+                    for event in await notifier.wait(job_ids, since, timeout)
+                ]
+                if events:
+                    since = events[-1]["version"]
+            return web.json_response(data=dict(events=events, version=since))
+
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+
+        async def _send(event):
+            await response.write(
+                f"id: {event['version']}\nevent: status\ndata: {json.dumps(event)}\n\n".encode()
+            )
+
+        for event in events or ():
+            await _send(event)
+        # jobs finished after `since` still have events to replay
+        running = {
+            job_id
+            for job_id in job_ids
+            if self.shared_status.job_status[job_id] not in FINISHED_STATUS
+        }
+        running.update(event.job_id for event in notifier.events(job_ids, since))
+        while running:
+            changes = await notifier.wait(list(running), since, timeout)
+            if not changes:
+                # keep alive comment
+                await response.write(b": ping\n\n")
+                continue
+            for event in changes:
+                await _send(event.to_dict())
+                if event.status in FINISHED_STATUS:
+                    running.discard(event.job_id)
+            since = changes[-1].version
+        await response.write_eof()
+        return response
+
+    async def _restful_timing(self, request: web.Request) -> web.Response:
+        """
+        handle timing request, summary of spans recorded for a job
+
+        query parameters:
+
+            job_id: job to summarize
+
+        Args:
+            request:
+
+        Returns:
+
+        """
+        job_id = request.query.get("job_id", None)
+        if job_id is None:
+            return web.json_response(data={}, status=400, reason="required `job_id`")
+        if job_id not in self.shared_status.job_status:
+            return web.json_response(
+                data=dict(job_id=job_id, status=str(_JobStatus.NOTFOUND)),
+                status=404,
+            )
+        spans = await asyncio.get_event_loop().run_in_executor(
+            None, load_spans, job_id
+        )
+        return web.json_response(data=dict(job_id=job_id, **summarize_spans(spans)))
+
 
 class ClusterManagerConnect(Logger):
     """
     cluster manager client
     """
 
-    def __init__(self, address, shared_status: _SharedStatus):
+    def __init__(
+        self,
+        address,
+        shared_status: _SharedStatus,
+        max_batch_size: int = 64,
+        max_inflight: int = 4,
+    ):
         """
         init cluster manager client
         Args:
             address:
             shared_status:
+            max_batch_size: max tasks sent in one submit request
+            max_inflight: max submit requests waiting for response
         """
         self.address = address
         self.shared_status = shared_status
+        self._max_batch_size = max_batch_size
+        self._inflight = asyncio.Semaphore(max_inflight)
         self._channel: Optional[grpc.aio.Channel] = None
         self._stub: Optional[cluster_pb2_grpc.ClusterManagerStub] = None
 
     async def submit_tasks_to_cluster(self):
         """
-        infinity loop to get task from queue and submit it to cluster
+        infinity loop to get tasks from queue and submit them to cluster.
+
+        tasks already queued are sent together in one request, and up to
+        `max_inflight` requests are pipelined without waiting for responses.
         """
+        queue = self.shared_status.cluster_task_queue
         while True:
-            task = await self.shared_status.cluster_task_queue.get()
-            self.debug(
-                f"task sending: task_id={task.task_id} task_type={task.task_type} to cluster"
+            tasks = [await queue.get()]
+            while len(tasks) < self._max_batch_size and not queue.empty():
+                tasks.append(queue.get_nowait())
+            await self._inflight.acquire()
+            asyncio.create_task(self._submit_batch(tasks))
+
+    async def _submit_batch(self, tasks: List[job_pb2.Task]):
+        spans = [
+            JobTracer(task.job_id).start_span(
+                "task.submit",
+                task_id=task.task_id,
+                task_type=task.task_type,
+                batch_size=len(tasks),
             )
-            await self._stub.TaskSubmit(cluster_pb2.TaskSubmit.REQ(task=task))
-            self.debug(
-                f"task sent: task_id={task.task_id} task_type={task.task_type} to cluster"
+            for task in tasks
+        ]
+        self.debug(f"sending {len(tasks)} tasks to cluster")
+        try:
+            response = await self._stub.TaskSubmitBatch(
+                cluster_pb2.TaskSubmitBatch.REQ(tasks=tasks)
             )
+            results = list(response.results)
+        except Exception as e:
+            self.exception(f"submit {len(tasks)} tasks to cluster failed: {e}")
+            results = [
+                cluster_pb2.TaskSubmit.REP(
+                    status=cluster_pb2.TaskSubmit.FAILED, exception=str(e)
+                )
+            ] * len(tasks)
+        finally:
+            self._inflight.release()
+
+        for task, span, result in zip(tasks, spans, results):
+            if result.status == cluster_pb2.TaskSubmit.SUCCESS:
+                self.debug(
+                    f"task sent: task_id={task.task_id} task_type={task.task_type} to cluster"
+                )
+            else:
+                span.error = result.exception or "submit failed"
+                self.error(
+                    f"task submit failed: task_id={task.task_id} task_type={task.task_type}, "
+                    f"{result.exception}"
+                )
+                if task.job_id in self.shared_status.job_status:
+                    self.shared_status.job_status[task.job_id] = _JobStatus.FAILED
+            JobTracer(task.job_id).export(span)
 
     async def task_resource_require(
         self, request: cluster_pb2.TaskResourceRequire.REQ
@@ -377,6 +885,48 @@ class ClusterManagerConnect(Logger):
         response = await self._stub.TaskResourceRequire(request)
         return response
 
+    async def task_resource_release(
+        self, request: cluster_pb2.TaskResourceRelease.REQ
+    ) -> cluster_pb2.TaskResourceRelease.REP:
+        """
+        give back resource required for a task never submitted
+        Args:
+            request:
+
+        Returns:
+
+        """
+        return await self._stub.TaskResourceRelease(request)
+
+    async def watch_tasks(self, handler: Callable[[cluster_pb2.TaskInfo], None]):
+        """
+        infinity loop to follow task state changes in cluster,
+        resumed from the last version seen after stream broken
+        Args:
+            handler: called with each changed task
+
+        Returns:
+
+        """
+        since = 0
+        while True:
+            try:
+                async for response in self._stub.WatchTasks(
+                    cluster_pb2.WatchTasks.REQ(since=since)
+                ):
+                    since = max(since, response.task.version)
+                    handler(response.task)
+            except grpc.aio.AioRpcError as e:
+                self.error(f"watch tasks stream broken: {e}")
+            self.warning(f"watch tasks stream closed, retry in 5 seconds")
+            await asyncio.sleep(5)
+
+    async def cluster_capacity(self) -> cluster_pb2.ClusterCapacity.REP:
+        """
+        query free capacity of cluster
+        """
+        return await self._stub.ClusterCapacity(cluster_pb2.ClusterCapacity.REQ())
+
     async def start_cluster_channel(self):
         """
         start channel to cluster manager
@@ -412,6 +962,118 @@ class ClusterManagerConnect(Logger):
         self.info(f"cluster channel started to {self.address}")
 
 
+class _ResourceWaitQueue(Logger):
+    """
+    jobs waiting for cluster resources, served one at a time in priority then
+    fifo order. the head job retries with exponential backoff until resources
+    acquired or timeout, and retries at once when capacity reported freed
+    """
+
+    def __init__(
+        self,
+        cluster: ClusterManagerConnect,
+        timeout: float,
+        initial_backoff: float = 1,
+        max_backoff: float = 30,
+    ):
+        self._cluster = cluster
+        self._timeout = timeout
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def acquire(self, job: Job) -> cluster_pb2.TaskResourceRequire.REP:
+        """
+        wait until resources required by job acquired
+
+        Raises:
+            FedvisionException: waited longer than timeout
+        """
+        future = asyncio.get_event_loop().create_future()
+        item = (-job.priority, next(self._counter), job, future, time.monotonic())
+        heapq.heappush(self._heap, item)
+        if self._heap[0] is item:
+            self._wakeup.set()
+        return await future
+
+    def notify_capacity_freed(self):
+        self._wakeup.set()
+
+    def _remove(self, item):
+        # heap may have changed while waiting for cluster manager
+        self._heap.remove(item)
+        heapq.heapify(self._heap)
+
+    async def _try_head(self) -> bool:
+        item = self._heap[0]
+        _, _, job, future, enqueue_time = item
+        if future.done():
+            # waiter cancelled
+            self._remove(item)
+            return True
+        try:
+            response = await self._cluster.task_resource_require(job.resource_required)
+        except grpc.aio.AioRpcError as e:
+            self.error(f"resource require of job {job.job_id} failed: {e}")
+            response = None
+        if (
+            response is not None
+            and response.status == cluster_pb2.TaskResourceRequire.SUCCESS
+        ):
+            self._remove(item)
+            if not future.done():
+                future.set_result(response)
+            else:
+                # waiter cancelled while requiring, nobody takes over the reservation
+                await self._release(job)
+            return True
+        if time.monotonic() - enqueue_time > self._timeout:
+            self._remove(item)
+            if not future.done():
+                future.set_exception(
+                    FedvisionException(
+                        f"job {job.job_id} failed due to no enough resource"
+                    )
+                )
+            return True
+        return False
+
+    async def _release(self, job: Job):
+        request = job.resource_required
+        try:
+            await self._cluster.task_resource_release(
+                cluster_pb2.TaskResourceRelease.REQ(
+                    job_id=request.job_id, task_id=request.task_id
+                )
+            )
+        except grpc.aio.AioRpcError as e:
+            self.error(f"release resource of job {job.job_id} failed: {e}")
+
+    async def run(self):
+        backoff = self._initial_backoff
+        while True:
+            while not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            self._wakeup.clear()
+            if await self._try_head():
+                backoff = self._initial_backoff
+                continue
+            self.debug(
+                f"{len(self._heap)} jobs waiting for resource, retry in {backoff} seconds"
+            )
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, self._max_backoff)
+
+
 class Master(Logger):
     def __init__(
         self,
@@ -420,6 +1082,15 @@ class Master(Logger):
         cluster_address: str,
         rest_port: int,
         rest_host: str = None,
+        job_store: str = "memory",
+        job_retention: float = 7 * 24 * 3600,
+        max_pending_jobs: int = 100,
+        max_concurrent_jobs: int = 4,
+        max_concurrent_compiles: int = 2,
+        resource_wait_timeout: float = 3600,
+        task_submit_batch_size: int = 64,
+        task_submit_inflight: int = 4,
+        dataset_size: int = 0,
     ):
         """
           init master
@@ -429,8 +1100,26 @@ class Master(Logger):
             coordinator_address:
             rest_port:
             rest_host:
+            job_store: sqlite database path of job status, or `memory`
+            job_retention: seconds finished jobs kept in job store
+            max_pending_jobs: submit rejected with 429 when this many jobs are waiting
+            max_concurrent_jobs: jobs compiling, acquiring resources or proposing at the same time
+            max_concurrent_compiles: jobs compiling at the same time
+            resource_wait_timeout: seconds a job waits for cluster resources before failed
+            task_submit_batch_size: max tasks sent to cluster in one request
+            task_submit_inflight: max task submit requests to cluster in flight
+            dataset_size: local training samples advertised to coordinator, 0 for unknown
         """
-        self.shared_status = _SharedStatus(party_id=party_id)
+        self.shared_status = _SharedStatus(
+            party_id=party_id,
+            job_store_path=job_store,
+            max_pending_jobs=max_pending_jobs,
+        )
+        self._job_semaphore = asyncio.Semaphore(max_concurrent_jobs)
+        self._compile_semaphore = asyncio.Semaphore(max_concurrent_compiles)
+        self._job_retention = job_retention
+        self._job_compaction_interval = 3600
+        self._job_compaction_task: Optional[asyncio.Task] = None
         self._coordinator = CoordinatorConnect(
             shared_status=self.shared_status, address=coordinator_address
         )
@@ -438,62 +1127,224 @@ class Master(Logger):
             shared_status=self.shared_status, port=rest_port, host=rest_host
         )
         self._cluster = ClusterManagerConnect(
-            shared_status=self.shared_status, address=cluster_address
+            shared_status=self.shared_status,
+            address=cluster_address,
+            max_batch_size=task_submit_batch_size,
+            max_inflight=task_submit_inflight,
+        )
+        self._resource_wait_queue = _ResourceWaitQueue(
+            cluster=self._cluster, timeout=resource_wait_timeout
         )
+        self._resource_wait_task: Optional[asyncio.Task] = None
+        # job id -> local tasks of running job not finished yet
+        self._local_tasks: MutableMapping[str, Set[str]] = {}
+        self._task_watch_task: Optional[asyncio.Task] = None
+        # advertised capacity: free workers refreshed from cluster, round time
+        # smoothed over rounds reported by finished tasks
+        self.shared_status.capacity.dataset_size = dataset_size
+        self._capacity_refresh_interval = 5
+        self._capacity_refresh_task: Optional[asyncio.Task] = None
+        self._round_time_smoothing = 0.3
+        self.shared_status.job_status.add_listener(self._on_job_status_changed)
 
     async def _submitted_job_handler(self):
         """
         handle submitted jobs.
         """
 
-        async def _co_handler(job: Job):
+        async def _co_handler(job: Job, compiled: bool = False):
 
             # todo: generalize this process
             # stick to paddle fl job now
 
-            # require endpoints before compile start since I don't find a proper way to modify
-            # service endpoints after job config generated.
-            # really need help hear!
+            tracer = job.tracer
+            pending = tracer.start_span("job.pending")
+            pending.start_time_ns = tracer.start_time_ns
+            pending.end()
+            tracer.export(pending)
+
+            slot_held = True
+            # resource acquired but not yet handed over to submitted tasks
+            resource_held: Optional[cluster_pb2.TaskResourceRequire.REQ] = None
+
+            async def _release_resource():
+                try:
+                    await self._cluster.task_resource_release(
+                        cluster_pb2.TaskResourceRelease.REQ(
+                            job_id=resource_held.job_id, task_id=resource_held.task_id
+                        )
+                    )
+                except Exception as _e:
+                    self.exception(f"release resource of job {job.job_id} failed: {_e}")
+                self._resource_wait_queue.notify_capacity_freed()
 
             try:
+                # compile job, compiled programs are endpoint agnostic,
+                # endpoints are bound when tasks generated
+                if not compiled:
+                    async with self._compile_semaphore:
+                        await job.compile()
+
+                # require endpoints, parked until cluster has enough resources.
+                # parked jobs give their slot to jobs behind them and take one
+                # back before preparing tasks and proposing
                 if job.resource_required is not None:
-                    response = await self._cluster.task_resource_require(
-                        job.resource_required
-                    )
-                    if response.status != cluster_pb2.TaskResourceRequire.SUCCESS:
-                        raise Exception(
-                            "job failed due to no enough resource"
-                        )  # todo: maybe wait some times and retry?
+                    self._job_semaphore.release()
+                    slot_held = False
+                    with tracer.span("job.resource_acquire"):
+                        response = await self._resource_wait_queue.acquire(job)
+                    resource_held = job.resource_required
                     job.set_required_resource(response)
-
-                # compile job
-                await job.compile()
+                    await self._job_semaphore.acquire()
+                    slot_held = True
+                with tracer.span("job.prepare_tasks"):
+                    await job.prepare_tasks()
 
                 # send proposal to coordinator
                 self.shared_status.job_status[job.job_id] = _JobStatus.PROPOSAL
-                proposal_response = await self._coordinator.make_proposal(
-                    job.generate_proposal_request()
-                )
+                with tracer.span("job.proposal") as span:
+                    proposal_response = await self._coordinator.make_proposal(
+                        job.generate_proposal_request()
+                    )
+                    span.attributes["status"] = coordinator_pb2.Proposal.Status.Name(
+                        proposal_response.status
+                    )
                 if proposal_response.status != coordinator_pb2.Proposal.SUCCESS:
                     self.debug(
                         f"proposal of job: {job.job_id} failed: {proposal_response.status}"
                     )
                     self.shared_status.job_status[job.job_id] = _JobStatus.FAILED
+                    tracer.end_root(status="proposal_failed")
                     return
 
                 # start local tasks
                 self.shared_status.job_status[job.job_id] = _JobStatus.RUNNING
-                for task in job.generate_local_tasks():
-                    self.debug(
-                        f"send local task: {task.task_id} with task type: {task.task_type} to cluster"
-                    )
-                    await self.shared_status.cluster_task_queue.put(task)
+                local_tasks = job.generate_local_tasks()
+                if local_tasks:
+                    # job finished once they all finished, see `_on_task_changed`
+                    self._local_tasks[job.job_id] = {
+                        task.task_id for task in local_tasks
+                    }
+                with tracer.span("job.dispatch_local_tasks"):
+                    for task in local_tasks:
+                        self.debug(
+                            f"send local task: {task.task_id} with task type: {task.task_type} to cluster"
+                        )
+                        await self.shared_status.cluster_task_queue.put(task)
+                if not local_tasks:
+                    # nothing left to run here, no task event would ever finish it.
+                    # resource required (if any) is released below, unused
+                    self.info(f"job {job.job_id} has no local task, finished")
+                    self.shared_status.job_status[job.job_id] = _JobStatus.SUCCESS
+                else:
+                    # released by cluster manager once tasks finished
+                    resource_held = None
+                tracer.end_root(status="dispatched")
             except Exception as e:
                 self.exception(f"run jobs failed: {e}")
+                self.shared_status.job_status[job.job_id] = _JobStatus.FAILED
+                tracer.end_root(status="failed", error=repr(e))
+            finally:
+                if slot_held:
+                    self._job_semaphore.release()
+                if resource_held is not None:
+                    await _release_resource()
+
+        async def _co_group_handler(jobs: List[Job]):
+            # a batch is admitted with one slot and compiled as a unit, jobs with
+            # identical model graph hit the compile cache filled by the first one
+            compiled = []
+            async with self._compile_semaphore:
+                for job in jobs:
+                    # noinspection PyBroadException
+                    try:
+                        await job.compile()
+                    except Exception as e:
+                        self.exception(f"compile job {job.job_id} failed: {e}")
+                        self.shared_status.job_status[job.job_id] = _JobStatus.FAILED
+                        job.tracer.end_root(status="failed", error=repr(e))
+                    else:
+                        compiled.append(job)
+
+            # fan out, the slot of the group goes to the first job, others take their own
+            for i, job in enumerate(compiled):
+                if i > 0:
+                    await self._job_semaphore.acquire()
+                asyncio.create_task(_co_handler(job, compiled=True))
+            if not compiled:
+                self._job_semaphore.release()
+
+        # admit next job only when a slot is free, so that
+        # jobs queued meanwhile are still ordered by priority
+        while True:
+            await self._job_semaphore.acquire()
+            submitted_jobs = await self.shared_status.job_queue.get()
+            if len(submitted_jobs) == 1:
+                asyncio.create_task(_co_handler(submitted_jobs[0]))
+            else:
+                asyncio.create_task(_co_group_handler(submitted_jobs))
+
+    def _on_task_changed(self, task: cluster_pb2.TaskInfo):
+        """
+        drive job to finished status by states of its local tasks
+        """
+        if task.state in (cluster_pb2.FINISHED, cluster_pb2.FAILED, cluster_pb2.CANCELLED):
+            # task slot and endpoints reclaimed by cluster
+            self._resource_wait_queue.notify_capacity_freed()
+        if task.state == cluster_pb2.FINISHED and task.round_time > 0:
+            self._update_round_time(task.round_time)
+
+        pending = self._local_tasks.get(task.job_id)
+        if pending is None or task.task_id not in pending:
+            return
+        if task.state == cluster_pb2.FINISHED:
+            pending.discard(task.task_id)
+            if pending:
+                return
+            self.info(f"all local tasks of job {task.job_id} finished")
+            self.shared_status.job_status[task.job_id] = _JobStatus.SUCCESS
+        elif task.state in (cluster_pb2.FAILED, cluster_pb2.CANCELLED):
+            self.error(
+                f"task {task.task_id} of job {task.job_id} "
+                f"{cluster_pb2.TaskState.Name(task.state)}: {task.exception}"
+            )
+            self.shared_status.job_status[task.job_id] = _JobStatus.FAILED
+
+    def _update_round_time(self, round_time: float):
+        capacity = self.shared_status.capacity
+        if capacity.recent_round_time <= 0:
+            capacity.recent_round_time = round_time
+        else:
+            capacity.recent_round_time += self._round_time_smoothing * (
+                round_time - capacity.recent_round_time
+            )
 
+    async def _capacity_refresh_loop(self):
+        """
+        periodically refresh free workers advertised to coordinator from cluster
+        """
         while True:
-            submitted_job = await self.shared_status.job_queue.get()
-            asyncio.create_task(_co_handler(submitted_job))
+            try:
+                response = await self._cluster.cluster_capacity()
+            except grpc.aio.AioRpcError as e:
+                self.error(f"query cluster capacity failed: {e}")
+            else:
+                self.shared_status.capacity.free_workers = response.free_task_slots
+            await asyncio.sleep(self._capacity_refresh_interval)
+
+    def _on_job_status_changed(self, job_id: str, status: _JobStatus):
+        if status in FINISHED_STATUS:
+            self._local_tasks.pop(job_id, None)
+
+    async def _job_compaction_loop(self):
+        """
+        periodically drop finished jobs out of retention
+        """
+        while True:
+            num_dropped = self.shared_status.job_status.compact(self._job_retention)
+            if num_dropped > 0:
+                self.info(f"job store compacted, {num_dropped} finished jobs dropped")
+            await asyncio.sleep(self._job_compaction_interval)
 
     async def start(self):
         """
@@ -505,6 +1356,12 @@ class Master(Logger):
 
         """
 
+        # jobs left unfinished by previous run can't be resumed
+        num_failed = self.shared_status.job_status.fail_unfinished()
+        if num_failed > 0:
+            self.warning(f"{num_failed} unfinished jobs of previous run marked failed")
+        self._job_compaction_task = asyncio.create_task(self._job_compaction_loop())
+
         # connect to cluster
         await self._cluster.start_cluster_channel()
         while True:
@@ -516,6 +1373,13 @@ class Master(Logger):
                 self.info(f"cluster channel ready!")
                 break
         asyncio.create_task(self._cluster.submit_tasks_to_cluster())
+        self._task_watch_task = asyncio.create_task(
+            self._cluster.watch_tasks(self._on_task_changed)
+        )
+        self._resource_wait_task = asyncio.create_task(self._resource_wait_queue.run())
+        self._capacity_refresh_task = asyncio.create_task(
+            self._capacity_refresh_loop()
+        )
 
         # start rest site
         await self._rest_site.start_rest_site()
@@ -532,6 +1396,7 @@ class Master(Logger):
                 self.info(f"coordinator channel ready!")
                 break
         asyncio.create_task(self._coordinator.subscribe())
+        asyncio.create_task(self._coordinator.heartbeat())
 
         # job process loop:
         # 1. get job from rest site
@@ -546,3 +1411,12 @@ class Master(Logger):
         await self._coordinator.stop_coordinator_channel(grace=1)
         await self._rest_site.stop_rest_site()
         await self._cluster.stop_cluster_channel(grace=1)
+        if self._job_compaction_task is not None:
+            self._job_compaction_task.cancel()
+        if self._resource_wait_task is not None:
+            self._resource_wait_task.cancel()
+        if self._task_watch_task is not None:
+            self._task_watch_task.cancel()
+        if self._capacity_refresh_task is not None:
+            self._capacity_refresh_task.cancel()
+        self.shared_status.job_status.close()
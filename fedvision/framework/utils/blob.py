@@ -0,0 +1,97 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+move large bytes fields out of packed tasks into content addressed blobs.
+
+Tasks of one job are nearly identical (same programs, same configs), so
+replacing those fields with digests lets every distinct payload be stored and
+transferred once. Fields are found by reflection, any task type works as long
+as its message is registered in the default symbol database.
+"""
+
+import hashlib
+from typing import MutableMapping, Mapping
+
+from google.protobuf import symbol_database
+from google.protobuf.descriptor import FieldDescriptor
+
+from fedvision.framework.protobuf import job_pb2
+from fedvision.framework.utils.exception import FedvisionException
+
+BLOB_MIN_SIZE = 1024
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+
+def blob_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _unpack(task: job_pb2.Task):
+    try:
+        message_cls = symbol_database.Default().GetSymbol(task.task.TypeName())
+    except KeyError:
+        raise FedvisionException(
+            f"message type {task.task.TypeName()} of task {task.task_id} not registered, "
+            f"module defining it should be imported first"
+        )
+    message = message_cls()
+    task.task.Unpack(message)
+    return message
+
+
+def extract_blobs(
+    task: job_pb2.Task,
+    blobs: MutableMapping[str, bytes],
+    min_size: int = BLOB_MIN_SIZE,
+):
+    """
+    replace bytes fields larger than `min_size` of packed task by digests in `task.blob_refs`
+
+    Args:
+        task: task to modify in place
+        blobs: digest -> data, extracted blobs are added to
+        min_size: fields smaller than this are kept inline
+    """
+    message = _unpack(task)
+    extracted = False
+    for field, value in message.ListFields():
+        if field.type != FieldDescriptor.TYPE_BYTES:
+            continue
+        if field.label == FieldDescriptor.LABEL_REPEATED or len(value) < min_size:
+            continue
+        digest = blob_digest(value)
+        blobs.setdefault(digest, value)
+        task.blob_refs[field.name] = digest
+        message.ClearField(field.name)
+        extracted = True
+    if extracted:
+        task.task.Pack(message)
+
+
+def resolve_blobs(task: job_pb2.Task, blobs: Mapping[str, bytes]):
+    """
+    inline blobs referenced by `task.blob_refs` back into packed task
+
+    Args:
+        task: task to modify in place
+        blobs: digest -> data, must contain all digests referenced
+    """
+    if not task.blob_refs:
+        return
+    message = _unpack(task)
+    for name, digest in task.blob_refs.items():
+        setattr(message, name, blobs[digest])
+    task.task.Pack(message)
+    task.ClearField("blob_refs")
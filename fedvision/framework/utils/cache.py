@@ -0,0 +1,150 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+content addressed directory cache on disk with LRU eviction
+"""
+
+import collections
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import MutableMapping, Optional
+
+from fedvision.framework.utils.logger import Logger
+
+
+def cache_key(**parts) -> str:
+    """
+    digest of json serializable parts, independent of argument order
+    """
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def _dir_size(path: Path) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+
+def copy_tree(src: Path, dst: Path):
+    """
+    copy directory, hard link files when possible
+    """
+
+    def _link_or_copy(s, d):
+        try:
+            os.link(s, d)
+        except OSError:
+            shutil.copy2(s, d)
+
+    shutil.copytree(src, dst, copy_function=_link_or_copy)
+
+
+class DirectoryCache(Logger):
+    """
+    cache of directories keyed by digest, least recently used entries are
+    evicted once total size exceeds `max_bytes`.
+
+    `put` may run in an executor thread, bookkeeping is guarded by a lock
+    while copying is not
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # key -> size, least recently used first, recovered from mtime on start
+        self._entries: MutableMapping[str, int] = collections.OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        entries = [
+            path
+            for path in self.root.iterdir()
+            if path.is_dir() and not path.name.startswith(".")
+        ]
+        for path in sorted(entries, key=lambda p: p.stat().st_mtime):
+            size = _dir_size(path)
+            self._entries[path.name] = size
+            self._total_bytes += size
+
+        # leftovers of interrupted puts
+        for path in self.root.glob(".tmp-*"):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def get(self, key: str) -> Optional[Path]:
+        path = self.root.joinpath(key)
+        with self._lock:
+            if key not in self._entries or not path.is_dir():
+                self._total_bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+        os.utime(path)
+        return path
+
+    def put(self, key: str, src: Path) -> Path:
+        """
+        copy directory `src` into cache under `key`
+        """
+        path = self.root.joinpath(key)
+        with self._lock:
+            if key in self._entries and path.is_dir():
+                return path
+
+        tmp = self.root.joinpath(f".tmp-{uuid.uuid1().hex}")
+        copy_tree(src, tmp)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # put concurrently by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+        size = _dir_size(path)
+        with self._lock:
+            # entry whose directory vanished is replaced, not counted twice
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            shutil.rmtree(self.root.joinpath(key), ignore_errors=True)
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            entries=len(self._entries),
+            bytes=self._total_bytes,
+        )
@@ -0,0 +1,228 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+minimal metrics exported in prometheus text format over http
+"""
+
+import abc
+import asyncio
+import bisect
+import math
+import time
+from typing import Callable, Iterable, List, MutableMapping, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from fedvision.framework.utils.logger import Logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric(metaclass=abc.ABCMeta):
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: MutableMapping[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """
+    gauge set directly or computed by a function at scrape time
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: MutableMapping[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable] = None
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable):
+        """
+        function returns a value if gauge has no label,
+        otherwise a mapping from tuple of label values to value
+        """
+        self._function = function
+
+    def samples(self):
+        values = self._values
+        if self._function is not None:
+            computed = self._function()
+            values = computed if self.labelnames else {(): computed}
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self._upper_bounds = sorted(buckets) + [float("inf")]
+        self._counts: MutableMapping[Tuple[str, ...], List[int]] = {}
+        self._sums: MutableMapping[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        if key not in self._counts:
+            self._counts[key] = [0] * len(self._upper_bounds)
+            self._sums[key] = 0.0
+        self._counts[key][bisect.bisect_left(self._upper_bounds, value)] += 1
+        self._sums[key] += value
+
+    def samples(self):
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for upper_bound, count in zip(self._upper_bounds, counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, key, extra=[("le", _format_value(upper_bound))]
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(self._sums[key])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self._metrics: MutableMapping[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class MetricsServer(Logger):
+    """
+    serve `/metrics` of a registry, and probe event loop lag
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        port: int,
+        host: str = None,
+        lag_probe_interval: float = 1,
+    ):
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self._lag_probe_interval = lag_probe_interval
+        self._lag_gauge = registry.gauge(
+            "fedvision_event_loop_lag_seconds",
+            "delay of event loop waking up a timer",
+        )
+        self._lag_probe_task: Optional[asyncio.Task] = None
+        self._site: Optional[web.TCPSite] = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.registry.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    async def _probe_lag(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self._lag_probe_interval)
+            self._lag_gauge.set(
+                max(0.0, time.monotonic() - start - self._lag_probe_interval)
+            )
+
+    async def start(self):
+        self.info(f"starting metrics server at port {self.port}")
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        self._site = web.TCPSite(runner=runner, host=self.host, port=self.port)
+        await self._site.start()
+        self._lag_probe_task = asyncio.create_task(self._probe_lag())
+        self.info(f"metrics server started at port {self.port}")
+
+    async def stop(self):
+        if self._lag_probe_task is not None:
+            self._lag_probe_task.cancel()
+            self._lag_probe_task = None
+        if self._site is not None:
+            await self._site.stop()
+            self._site = None
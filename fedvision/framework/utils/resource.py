@@ -0,0 +1,77 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+resource quantities of cluster workers and tasks: cpu cores, memory and disk
+"""
+
+import os
+import shutil
+from typing import Mapping, Optional, Tuple
+
+from fedvision.framework.protobuf import job_pb2
+from fedvision.framework.utils.exception import FedvisionException
+
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+
+def parse_size(size) -> int:
+    """
+    bytes of `size`, a number or a string like `512M`, `8G` or `1.5GiB`
+    """
+    if isinstance(size, (int, float)):
+        return int(size)
+    text = str(size).strip().lower()
+    for suffix in ("ib", "b"):
+        if text.endswith(suffix):
+            text = text[: -len(suffix)]
+            break
+    unit = text[-1:] if text[-1:] in _SIZE_UNITS else ""
+    number = text[:-1] if unit else text
+    try:
+        return int(float(number) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise FedvisionException(f"invalid size {size}")
+
+
+def resource_pb(spec: Optional[Mapping]) -> job_pb2.Resource:
+    """
+    resource message from config like `{cpu_cores: 2, memory: 4G, disk: 1G}`
+    """
+    if not spec:
+        return job_pb2.Resource()
+    return job_pb2.Resource(
+        cpu_cores=float(spec.get("cpu_cores", 0)),
+        memory_bytes=parse_size(spec.get("memory", 0)),
+        disk_bytes=parse_size(spec.get("disk", 0)),
+    )
+
+
+def detect_resources(path: str = ".") -> Tuple[float, int, int]:
+    """
+    cpu cores, physical memory bytes and free disk bytes under `path` of this host, 0 if unknown
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpu_cores = len(os.sched_getaffinity(0))
+    else:
+        cpu_cores = os.cpu_count() or 0
+    try:
+        memory_bytes = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        memory_bytes = 0
+    try:
+        disk_bytes = shutil.disk_usage(path).free
+    except OSError:
+        disk_bytes = 0
+    return float(cpu_cores), memory_bytes, disk_bytes
@@ -0,0 +1,274 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+job lifecycle tracing.
+
+Spans are appended as json lines in OpenTelemetry (OTLP/JSON) span layout to
+`trace.jsonl` files under the job's log directory. Trace id and root span id
+are derived from job id, so processes recording spans of the same job
+(master, workers) join one trace without propagating context.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterator, List, MutableMapping, Optional
+
+import attr
+
+from fedvision import __logs_dir__
+
+
+def job_log_dir(job_id: str) -> Path:
+    return Path(__logs_dir__).joinpath(f"jobs/{job_id}")
+
+
+def trace_id_of(job_id: str) -> str:
+    return hashlib.md5(job_id.encode("utf-8")).hexdigest()
+
+
+def root_span_id_of(job_id: str) -> str:
+    return hashlib.md5(f"{job_id}#root".encode("utf-8")).hexdigest()[:16]
+
+
+def _new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+@attr.s
+class Span(object):
+    name = attr.ib(type=str)
+    trace_id = attr.ib(type=str)
+    parent_span_id = attr.ib(type=Optional[str])
+    span_id = attr.ib(type=str, factory=_new_span_id)
+    start_time_ns = attr.ib(type=int, factory=time.time_ns)
+    end_time_ns = attr.ib(type=Optional[int], default=None)
+    attributes = attr.ib(type=MutableMapping, factory=dict)
+    error = attr.ib(type=Optional[str], default=None)
+
+    def end(self, end_time_ns: Optional[int] = None):
+        if self.end_time_ns is None:
+            self.end_time_ns = time.time_ns() if end_time_ns is None else end_time_ns
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns),
+            "attributes": [
+                {"key": k, "value": _attribute_value(v)}
+                for k, v in self.attributes.items()
+            ],
+            "status": {"code": "STATUS_CODE_OK"}
+            if self.error is None
+            else {"code": "STATUS_CODE_ERROR", "message": self.error},
+        }
+        if self.parent_span_id is not None:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class JobTracer(object):
+    """
+    records spans of one job into a json lines file
+    """
+
+    def __init__(self, job_id: str, path: Optional[Path] = None):
+        """
+        Args:
+            job_id:
+            path: spans file, default to `<job log dir>/master/trace.jsonl`
+        """
+        self.job_id = job_id
+        self.trace_id = trace_id_of(job_id)
+        self.root_span_id = root_span_id_of(job_id)
+        self.start_time_ns = time.time_ns()
+        self._path = (
+            path
+            if path is not None
+            else job_log_dir(job_id).joinpath("master", "trace.jsonl")
+        )
+
+    def start_span(self, name, parent_span_id: Optional[str] = None, **attributes):
+        return Span(
+            name=name,
+            trace_id=self.trace_id,
+            parent_span_id=parent_span_id or self.root_span_id,
+            attributes=attributes,
+        )
+
+    @contextlib.contextmanager
+    def span(
+        self, name, parent_span_id: Optional[str] = None, **attributes
+    ) -> Iterator[Span]:
+        """
+        time the block as a span, failed if the block raises
+        """
+        span = self.start_span(name, parent_span_id, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            self.export(span)
+
+    def export(self, span: Span):
+        """
+        append span, ended now if not ended yet
+        """
+        span.end()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._path.open("a") as f:
+            f.write(json.dumps(span.to_otlp()))
+            f.write("\n")
+
+    def end_root(self, **attributes):
+        """
+        record the root span from job created until now
+        """
+        span = Span(
+            name="job",
+            trace_id=self.trace_id,
+            parent_span_id=None,
+            span_id=self.root_span_id,
+            start_time_ns=self.start_time_ns,
+            attributes=dict(job_id=self.job_id, **attributes),
+        )
+        self.export(span)
+
+
+class PhaseTimer(object):
+    """
+    timestamps of phases inside a subprocess (e.g. compile), dumped to a file
+    and converted to spans by the parent process
+    """
+
+    def __init__(self):
+        self.timings = {"main": time.time_ns()}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.time_ns()
+        try:
+            yield
+        finally:
+            self.timings[name] = [start, time.time_ns()]
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.timings, f)
+
+
+# seconds of each training round, written to working directory of a task by
+# trainers and read back by the worker running it
+ROUND_TIMES_FILE = "rounds.json"
+
+
+class RoundTimer(object):
+    """
+    durations of training rounds inside a trainer subprocess, dumped after each
+    round so that rounds finished are kept even if trainer killed
+    """
+
+    def __init__(self, path=ROUND_TIMES_FILE):
+        self.path = path
+        self.round_times: List[float] = []
+
+    @contextlib.contextmanager
+    def round(self):
+        start = time.monotonic()
+        yield
+        self.round_times.append(time.monotonic() - start)
+        with open(self.path, "w") as f:
+            json.dump(self.round_times, f)
+
+
+def recent_round_time(path, num_rounds: int = 5) -> float:
+    """
+    mean seconds of last `num_rounds` rounds recorded by `RoundTimer`, 0 if none
+    """
+    try:
+        with open(path) as f:
+            round_times = json.load(f)[-num_rounds:]
+    except (OSError, ValueError):
+        return 0.0
+    if not round_times:
+        return 0.0
+    return sum(round_times) / len(round_times)
+
+
+def load_spans(job_id: str) -> List[dict]:
+    """
+    all spans recorded for job found in its log directory
+    """
+    spans = []
+    for path in job_log_dir(job_id).rglob("trace.jsonl"):
+        with path.open() as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    spans.append(json.loads(line))
+    spans.sort(key=lambda s: int(s["startTimeUnixNano"]))
+    return spans
+
+
+def summarize_spans(spans: List[dict]):
+    """
+    per span durations relative to job start, plus totals by span name
+    """
+    if not spans:
+        return dict(spans=[], totals={})
+    origin = min(int(s["startTimeUnixNano"]) for s in spans)
+    entries = []
+    totals: MutableMapping[str, float] = {}
+    for s in spans:
+        start = int(s["startTimeUnixNano"])
+        duration = (int(s["endTimeUnixNano"]) - start) / 1e9
+        attributes = {
+            a["key"]: next(iter(a["value"].values())) for a in s.get("attributes", [])
+        }
+        entries.append(
+            dict(
+                name=s["name"],
+                offset=(start - origin) / 1e9,
+                duration=duration,
+                status=s.get("status", {}).get("code"),
+                attributes=attributes,
+            )
+        )
+        totals[s["name"]] = totals.get(s["name"], 0.0) + duration
+    task_starts = [e["offset"] for e in entries if e["name"] == "task"]
+    return dict(
+        spans=entries,
+        totals=totals,
+        submit_to_first_task_start=min(task_starts) if task_starts else None,
+    )
@@ -25,6 +25,7 @@ from paddle import fluid
 from fedvision.ml.paddle.paddle_detection._empty_optimizer import (
     EmptyOptimizer,
 )
+from fedvision.framework.utils.tracing import PhaseTimer
 from paddle_fl.paddle_fl.core.master.job_generator import JobGenerator
 from paddle_fl.paddle_fl.core.strategy.fl_strategy_base import (
     FedAvgStrategy,
@@ -81,7 +82,14 @@ class Model(object):
 @click.option(
     "--algorithm-config", type=click.Path(exists=True, file_okay=True, dir_okay=False)
 )
-def fl_master(algorithm_config, ps_endpoint, config):
+@click.option(
+    "--timings",
+    type=click.Path(file_okay=True, dir_okay=False),
+    default=None,
+    help="file to dump phase timings to",
+)
+def fl_master(algorithm_config, ps_endpoint, config, timings):
+    timer = PhaseTimer()
     logging.basicConfig(
         level=logging.DEBUG, format="%(asctime)s-%(levelname)s: %(message)s"
     )
@@ -91,7 +99,8 @@ def fl_master(algorithm_config, ps_endpoint, config):
     worker_num = config_json["worker_num"]
 
     model = Model()
-    model.build_program(algorithm_config)
+    with timer.phase("build"):
+        model.build_program(algorithm_config)
 
     job_generator = JobGenerator()
     job_generator.set_losses([model.loss])
@@ -108,9 +117,12 @@ def fl_master(algorithm_config, ps_endpoint, config):
 
     endpoints = [ps_endpoint]
     output = "compile"
-    job_generator.generate_fl_job(
-        strategy, server_endpoints=endpoints, worker_num=worker_num, output=output
-    )
+    with timer.phase("transpile"):
+        job_generator.generate_fl_job(
+            strategy, server_endpoints=endpoints, worker_num=worker_num, output=output
+        )
+    if timings is not None:
+        timer.dump(timings)
 
 
 if __name__ == "__main__":
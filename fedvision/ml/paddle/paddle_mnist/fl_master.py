@@ -17,6 +17,7 @@ import logging
 import click
 from paddle import fluid
 
+from fedvision.framework.utils.tracing import PhaseTimer
 from paddle_fl.paddle_fl.core.master.job_generator import JobGenerator
 from paddle_fl.paddle_fl.core.strategy.fl_strategy_base import (
     FedAvgStrategy,
@@ -66,7 +67,14 @@ class CNN(object):
 @click.option(
     "--algorithm-config", type=click.Path(exists=True, file_okay=True, dir_okay=False)
 )
-def fl_master(algorithm_config, ps_endpoint, config):
+@click.option(
+    "--timings",
+    type=click.Path(file_okay=True, dir_okay=False),
+    default=None,
+    help="file to dump phase timings to",
+)
+def fl_master(algorithm_config, ps_endpoint, config, timings):
+    timer = PhaseTimer()
     logging.basicConfig(
         level=logging.DEBUG, format="%(asctime)s-%(levelname)s: %(message)s"
     )
@@ -77,7 +85,8 @@ def fl_master(algorithm_config, ps_endpoint, config):
     worker_num = config_json["worker_num"]
     inner_step = config_json["inner_step"]
 
-    model = CNN()
+    with timer.phase("build"):
+        model = CNN()
     job_generator = JobGenerator()
     job_generator.set_losses([model.loss])
     job_generator.set_optimizer(fluid.optimizer.Adam(0.001))
@@ -93,9 +102,12 @@ def fl_master(algorithm_config, ps_endpoint, config):
 
     endpoints = [ps_endpoint]
     output = "compile"
-    job_generator.generate_fl_job(
-        strategy, server_endpoints=endpoints, worker_num=worker_num, output=output
-    )
+    with timer.phase("transpile"):
+        job_generator.generate_fl_job(
+            strategy, server_endpoints=endpoints, worker_num=worker_num, output=output
+        )
+    if timings is not None:
+        timer.dump(timings)
 
 
 if __name__ == "__main__":
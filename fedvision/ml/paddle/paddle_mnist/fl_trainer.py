@@ -36,6 +36,7 @@ import yaml
 
 from fedvision.paddle_fl.tasks.utils import FedAvgTrainer
 from fedvision import get_data_dir
+from fedvision.framework.utils.tracing import RoundTimer
 
 
 @click.command()
@@ -182,6 +183,8 @@ def fl_trainer(
 
         vdl_writer = LogWriter("vdl_log")
 
+    # reported by worker, see `ClusterWorker`
+    round_timer = RoundTimer()
     while epoch_id < max_iter:
         epoch_id += 1
         if not trainer.scheduler_agent.join(epoch_id):
@@ -190,23 +193,25 @@ def fl_trainer(
 
         logging.debug(f"epoch {epoch_id} start train")
 
-        for step_id, data in enumerate(mnist_loader()):
-            outs = trainer.run(feeder.feed(data), fetch=trainer._target_names)
-            if use_vdl:
-                stats = {
-                    k: np.array(v).mean() for k, v in zip(trainer._target_names, outs)
-                }
-                for loss_name, loss_value in stats.items():
-                    vdl_writer.add_scalar(loss_name, loss_value, step)
-            step += 1
-            logging.debug(f"step: {step}, outs: {outs}")
-
-        # save model
-        logging.debug(f"saving model at {epoch_id}-th epoch")
-        trainer.save_model(f"model/{epoch_id}")
-
-        # info scheduler
-        trainer.scheduler_agent.finish()
+        with round_timer.round():
+            for step_id, data in enumerate(mnist_loader()):
+                outs = trainer.run(feeder.feed(data), fetch=trainer._target_names)
+                if use_vdl:
+                    stats = {
+                        k: np.array(v).mean()
+                        for k, v in zip(trainer._target_names, outs)
+                    }
+                    for loss_name, loss_value in stats.items():
+                        vdl_writer.add_scalar(loss_name, loss_value, step)
+                step += 1
+                logging.debug(f"step: {step}, outs: {outs}")
+
+            # save model
+            logging.debug(f"saving model at {epoch_id}-th epoch")
+            trainer.save_model(f"model/{epoch_id}")
+
+            # info scheduler
+            trainer.scheduler_agent.finish()
         checkpoint.save(trainer.exe, trainer._main_program, f"checkpoint/{epoch_id}")
 
     logging.debug(f"reach max iter, finish training")
@@ -0,0 +1,120 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+late binding of service endpoints in transpiled programs.
+
+Programs are compiled against `PLACEHOLDER_ENDPOINT`, and the placeholder in
+string attributes of ops (`epmap`, `endpoints`, `endpoint`, ...) is replaced by
+the endpoint allocated at dispatch time.
+
+Rewriting walks the serialized `ProgramDesc` at wire level
+(ProgramDesc.blocks -> BlockDesc.ops -> OpDesc.attrs -> Attr.s/strings),
+everything else is copied byte by byte, so paddle is not imported here.
+"""
+
+from typing import Mapping
+
+PLACEHOLDER_ENDPOINT = "127.0.0.254:65535"
+
+_WIRE_VARINT = 0
+_WIRE_64BIT = 1
+_WIRE_LENGTH_DELIMITED = 2
+_WIRE_32BIT = 5
+
+# field numbers in paddle framework.proto
+_PROGRAM_BLOCKS = 1
+_BLOCK_OPS = 4
+_OP_ATTRS = 4
+_ATTR_S = 5
+_ATTR_STRINGS = 8
+
+
+def _read_varint(buf: bytes, pos: int):
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _rewrite(buf: bytes, path, mapping: Mapping[bytes, bytes]) -> bytes:
+    """
+    rewrite message `buf`, `path` tells field numbers to descend into
+    """
+    out = bytearray()
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        start = pos
+        tag, pos = _read_varint(buf, pos)
+        field_number, wire_type = tag >> 3, tag & 0x7
+        if wire_type == _WIRE_VARINT:
+            _, pos = _read_varint(buf, pos)
+        elif wire_type == _WIRE_64BIT:
+            pos += 8
+        elif wire_type == _WIRE_32BIT:
+            pos += 4
+        elif wire_type == _WIRE_LENGTH_DELIMITED:
+            length, value_start = _read_varint(buf, pos)
+            pos = value_start + length
+            value = buf[value_start:pos]
+            if path and field_number == path[0]:
+                value = _rewrite(value, path[1:], mapping)
+            elif not path and field_number in (_ATTR_S, _ATTR_STRINGS):
+                value = mapping.get(value, value)
+            else:
+                out += buf[start:pos]
+                continue
+            out += _encode_varint(tag)
+            out += _encode_varint(len(value))
+            out += value
+            continue
+        else:
+            raise ValueError(f"unsupported wire type {wire_type}")
+        out += buf[start:pos]
+    return bytes(out)
+
+
+def rewrite_endpoints(program: bytes, mapping: Mapping[str, str]) -> bytes:
+    """
+    replace endpoints in string attributes of all ops of a serialized program
+
+    Args:
+        program: serialized `ProgramDesc`
+        mapping: endpoint in program -> endpoint to bind
+
+    Returns:
+        serialized `ProgramDesc`
+    """
+    encoded = {k.encode("utf-8"): v.encode("utf-8") for k, v in mapping.items()}
+    if not any(k in program for k in encoded):
+        return program
+    return _rewrite(program, (_PROGRAM_BLOCKS, _BLOCK_OPS, _OP_ATTRS), encoded)
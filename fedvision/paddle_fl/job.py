@@ -12,22 +12,96 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import functools
+import hashlib
+import importlib.util
 import json
+import os
 import sys
+import time
 from pathlib import Path
-from typing import List
+from typing import List, MutableMapping, Optional
 
-from fedvision import __logs_dir__
+from fedvision import __logs_dir__, __data_dir__
 from fedvision.framework.abc.job import Job
 from fedvision.framework.cluster.executor import ProcessExecutor
 from fedvision.framework.protobuf import job_pb2, coordinator_pb2, cluster_pb2
+from fedvision.framework.utils.cache import DirectoryCache, cache_key, copy_tree
 from fedvision.framework.utils.exception import FedvisionJobCompileException
+from fedvision.framework.utils.logger import Logger
+from fedvision.framework.utils.resource import resource_pb
+from fedvision.paddle_fl.endpoint import PLACEHOLDER_ENDPOINT, rewrite_endpoints
 from fedvision.paddle_fl.protobuf import fl_job_pb2
 
 JOB_TYPE = "paddle_fl"
 
+COMPILE_CACHE_DIR_ENV = "FEDVISION_PADDLE_FL_COMPILE_CACHE_DIR"
+COMPILE_CACHE_SIZE_ENV = "FEDVISION_PADDLE_FL_COMPILE_CACHE_SIZE"
 
-class PaddleFLJob(Job):
+# job config read by trainers at runtime, not by fl_master, so jobs differing only
+# in these share compiled programs
+RUNTIME_CONFIG_KEYS = {
+    "proposal_wait_time",
+    "max_iter",
+    "device",
+    "use_vdl",
+    "resources",
+}
+
+# task type -> key of its resource request in `resources` of job config
+_RESOURCE_CONFIG_KEYS = {"fl_trainer": "trainer", "fl_aggregator": "aggregator"}
+
+_compile_cache: Optional[DirectoryCache] = None
+# cache key -> future done when compile in progress finished
+_inflight_compiles: MutableMapping[str, asyncio.Future] = {}
+
+
+def get_compile_cache() -> DirectoryCache:
+    """
+    compile cache shared by paddle fl jobs of this process, location and size
+    (bytes) can be set by environment variables
+    """
+    global _compile_cache
+    if _compile_cache is None:
+        _compile_cache = DirectoryCache(
+            root=Path(
+                os.environ.get(
+                    COMPILE_CACHE_DIR_ENV,
+                    os.path.join(__data_dir__, "compile_cache", JOB_TYPE),
+                )
+            ),
+            max_bytes=int(os.environ.get(COMPILE_CACHE_SIZE_ENV, 10 * 1024 ** 3)),
+        )
+    return _compile_cache
+
+
+@functools.lru_cache()
+def _paddle_version() -> str:
+    # read from package metadata, importing paddle in master is too heavy
+    try:
+        import pkg_resources
+    except ImportError:
+        return "unknown"
+    for dist in ["paddlepaddle", "paddlepaddle-gpu"]:
+        try:
+            return f"{dist}=={pkg_resources.get_distribution(dist).version}"
+        except pkg_resources.DistributionNotFound:
+            continue
+    return "unknown"
+
+
+@functools.lru_cache()
+def _file_digest(module) -> str:
+    # strategy settings are defined in fl_master module of each program
+    spec = importlib.util.find_spec(module)
+    if spec is None or spec.origin is None:
+        return ""
+    with open(spec.origin, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class PaddleFLJob(Job, Logger):
     job_type = JOB_TYPE
 
     @classmethod
@@ -55,13 +129,31 @@ class PaddleFLJob(Job):
         self._worker_num = worker_num
         self._program = program
         self._trainer_entrypoint = f"fedvision.ml.paddle.{self._program}.fl_trainer"
+        self._master_entrypoint = f"fedvision.ml.paddle.{self._program}.fl_master"
 
+        self._config = config
+        self._artifacts: MutableMapping[str, bytes] = {}
         self._config_string = json.dumps(config)
         self._algorithm_config = algorithm_config
+        # parsed on load, so that malformed requests fail submit
+        resources = config.get("resources") or {}
+        self._task_resources = {
+            task_type: resource_pb(resources.get(key))
+            for task_type, key in _RESOURCE_CONFIG_KEYS.items()
+        }
 
     @property
     def resource_required(self):
-        return cluster_pb2.TaskResourceRequire.REQ(num_endpoints=2)
+        # server and scheduler endpoints of aggregator task
+        return cluster_pb2.TaskResourceRequire.REQ(
+            num_endpoints=2,
+            job_id=self.job_id,
+            task_id="aggregator",
+            resource=self.task_resource("fl_aggregator"),
+        )
+
+    def task_resource(self, task_type):
+        return self._task_resources.get(task_type, job_pb2.Resource())
 
     # noinspection PyAttributeOutsideInit
     def set_required_resource(self, response):
@@ -73,7 +165,57 @@ class PaddleFLJob(Job):
     def compile_path(self):
         return Path(__logs_dir__).joinpath(f"jobs/{self.job_id}/master")
 
+    def _compile_cache_key(self):
+        return cache_key(
+            program=self._program,
+            algorithm_config=hashlib.sha256(
+                self._algorithm_config.encode("utf-8")
+            ).hexdigest(),
+            config={
+                k: v for k, v in self._config.items() if k not in RUNTIME_CONFIG_KEYS
+            },
+            strategy=_file_digest(self._master_entrypoint),
+            paddle=_paddle_version(),
+        )
+
     async def compile(self):
+        with self.tracer.span("job.compile") as span:
+            await self._compile_cached(span)
+
+    async def _compile_cached(self, span):
+        cache = get_compile_cache()
+        key = self._compile_cache_key()
+
+        # identical jobs submitted together share one compile
+        while key in _inflight_compiles:
+            await asyncio.wait({_inflight_compiles[key]})
+
+        loop = asyncio.get_event_loop()
+        cached = cache.get(key)
+        span.attributes["cache_hit"] = cached is not None
+        if cached is not None:
+            # walking and linking program directories, keep them off event loop
+            await loop.run_in_executor(None, self._restore_compiled, cached)
+            self.info(f"job {self.job_id} compile cache hit: {cache.stats()}")
+            return
+
+        inflight = _inflight_compiles[key] = loop.create_future()
+        try:
+            await self._compile(span.span_id)
+            await loop.run_in_executor(
+                None, cache.put, key, self.compile_path.joinpath("compile")
+            )
+        finally:
+            # waiters compile by themselves if this one failed
+            del _inflight_compiles[key]
+            inflight.set_result(None)
+        self.info(f"job {self.job_id} compile cache miss: {cache.stats()}")
+
+    def _restore_compiled(self, cached: Path):
+        self.compile_path.mkdir(parents=True, exist_ok=True)
+        copy_tree(cached, self.compile_path.joinpath("compile"))
+
+    async def _compile(self, parent_span_id):
         executor = ProcessExecutor(self.compile_path)
         with self.compile_path.joinpath("algorithm_config.yaml").open("w") as f:
             f.write(self._algorithm_config)
@@ -82,18 +224,43 @@ class PaddleFLJob(Job):
         executable = sys.executable
         cmd = " ".join(
             [
-                f"{executable} -m fedvision.ml.paddle.{self._program}.fl_master",
-                f"--ps-endpoint {self._server_endpoint}",
+                f"{executable} -m {self._master_entrypoint}",
+                # bound to allocated endpoint when tasks generated
+                f"--ps-endpoint {PLACEHOLDER_ENDPOINT}",
                 f"--algorithm-config algorithm_config.yaml",
                 f"--config config.json",
+                f"--timings timings.json",
                 f">{executor.stdout} 2>{executor.stderr}",
             ]
         )
+        spawn_time_ns = time.time_ns()
         returncode = await executor.execute(cmd)
+        self._export_compile_spans(spawn_time_ns, parent_span_id)
         if returncode != 0:
 
             raise FedvisionJobCompileException("compile error")
 
+    def _export_compile_spans(self, spawn_time_ns, parent_span_id):
+        """
+        split compile span by phases timed inside fl_master
+        """
+        try:
+            with self.compile_path.joinpath("timings.json").open() as f:
+                timings = json.load(f)
+        except (OSError, ValueError):
+            return
+        spawn = self.tracer.start_span("compile.spawn", parent_span_id)
+        spawn.start_time_ns = spawn_time_ns
+        spawn.end(timings["main"])
+        self.tracer.export(spawn)
+        for phase in ["build", "transpile"]:
+            if phase not in timings:
+                continue
+            span = self.tracer.start_span(f"compile.{phase}", parent_span_id)
+            span.start_time_ns, end_time_ns = timings[phase]
+            span.end(end_time_ns)
+            self.tracer.export(span)
+
     def generate_proposal_request(self) -> coordinator_pb2.Proposal.REQ:
         request = coordinator_pb2.Proposal.REQ(
             job_id=self.job_id,
@@ -112,44 +279,74 @@ class PaddleFLJob(Job):
             self._generate_aggregator_task_pb(),
         ]
 
+    async def prepare_tasks(self):
+        # file io and endpoint binding of possibly large programs, keep them off event loop
+        self._artifacts = await asyncio.get_event_loop().run_in_executor(
+            None, self._load_artifacts
+        )
+
+    def _artifact_paths(self):
+        paths = [
+            "compile/server0/server.main.program",
+            "compile/server0/server.startup.program",
+        ]
+        for i in range(self._worker_num):
+            paths.extend(
+                f"compile/trainer{i}/{name}"
+                for name in [
+                    "trainer.main.program",
+                    "trainer.startup.program",
+                    "trainer.send.program",
+                    "trainer.recv.program",
+                    "feed_names",
+                    "target_names",
+                    "strategy.pkl",
+                    "feeds.pkl",
+                ]
+            )
+        return paths
+
+    def _load_artifacts(self) -> MutableMapping[str, bytes]:
+        """
+        read every artifact once, programs bound to allocated server endpoint.
+        trainers mostly share identical files, so each distinct content is
+        bound once and shared
+        """
+        mapping = {PLACEHOLDER_ENDPOINT: self._server_endpoint}
+        artifacts = {}
+        by_digest = {}
+        for path in self._artifact_paths():
+            data = _load_program_bytes(self.compile_path.joinpath(path))
+            digest = hashlib.sha256(data).digest()
+            if digest not in by_digest:
+                if path.endswith(".program"):
+                    data = rewrite_endpoints(data, mapping)
+                by_digest[digest] = data
+            artifacts[path] = by_digest[digest]
+        return artifacts
+
     def _generate_trainer_task_pb(self, task_pb, i):
+        artifacts = self._artifacts
         trainer_pb = fl_job_pb2.PaddleFLWorkerTask(
             scheduler_ep=self._aggregator_endpoint,
             trainer_id=i,
             trainer_ep=f"trainer_{i}",
             entrypoint=self._trainer_entrypoint,
-            main_program=_load_program_bytes(
-                self.compile_path.joinpath(f"compile/trainer{i}/trainer.main.program")
-            ),
-            startup_program=_load_program_bytes(
-                self.compile_path.joinpath(
-                    f"compile/trainer{i}/trainer.startup.program"
-                )
-            ),
-            send_program=_load_program_bytes(
-                self.compile_path.joinpath(f"compile/trainer{i}/trainer.send.program")
-            ),
-            recv_program=_load_program_bytes(
-                self.compile_path.joinpath(f"compile/trainer{i}/trainer.recv.program")
-            ),
-            feed_names=_load_program_bytes(
-                self.compile_path.joinpath(f"compile/trainer{i}/feed_names")
-            ),
-            target_names=_load_program_bytes(
-                self.compile_path.joinpath(f"compile/trainer{i}/target_names")
-            ),
-            strategy=_load_program_bytes(
-                self.compile_path.joinpath(f"compile/trainer{i}/strategy.pkl")
-            ),
-            feeds=_load_program_bytes(
-                self.compile_path.joinpath(f"compile/trainer{1}/feeds.pkl")
-            ),
+            main_program=artifacts[f"compile/trainer{i}/trainer.main.program"],
+            startup_program=artifacts[f"compile/trainer{i}/trainer.startup.program"],
+            send_program=artifacts[f"compile/trainer{i}/trainer.send.program"],
+            recv_program=artifacts[f"compile/trainer{i}/trainer.recv.program"],
+            feed_names=artifacts[f"compile/trainer{i}/feed_names"],
+            target_names=artifacts[f"compile/trainer{i}/target_names"],
+            strategy=artifacts[f"compile/trainer{i}/strategy.pkl"],
+            feeds=artifacts[f"compile/trainer{i}/feeds.pkl"],
             config_string=self._config_string,
             algorithm_config_string=self._algorithm_config,
         )
         task_pb.job_id = self.job_id
         task_pb.task_id = f"trainer_{i}"
         task_pb.task_type = "fl_trainer"
+        task_pb.resource.CopyFrom(self.task_resource("fl_trainer"))
         task_pb.task.Pack(trainer_pb)
         return task_pb
 
@@ -157,12 +354,12 @@ class PaddleFLJob(Job):
         scheduler_pb = fl_job_pb2.PaddleFLAggregatorTask(
             scheduler_ep=self._aggregator_endpoint,
         )
-        scheduler_pb.main_program = _load_program_bytes(
-            self.compile_path.joinpath(f"compile/server0/server.main.program")
-        )
-        scheduler_pb.startup_program = _load_program_bytes(
-            self.compile_path.joinpath(f"compile/server0/server.startup.program")
-        )
+        scheduler_pb.main_program = self._artifacts[
+            "compile/server0/server.main.program"
+        ]
+        scheduler_pb.startup_program = self._artifacts[
+            "compile/server0/server.startup.program"
+        ]
         scheduler_pb.config_string = self._config_string
 
         task_pb = job_pb2.Task(
@@ -170,11 +367,14 @@ class PaddleFLJob(Job):
             task_id=f"aggregator",
             task_type="fl_aggregator",
             assignee=self._aggregator_assignee,
+            resource=self.task_resource("fl_aggregator"),
         )
         task_pb.task.Pack(scheduler_pb)
         return task_pb
 
 
-def _load_program_bytes(path: Path):
+def _load_program_bytes(path: Path) -> bytes:
+    # protobuf bytes fields and endpoint rewriting need a bytes object anyway,
+    # one plain read fills it without an extra copy through a mapping
     with path.open("rb") as f:
         return f.read()
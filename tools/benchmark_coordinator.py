@@ -0,0 +1,288 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+load generation harness for coordinator.
+
+A coordinator is started in a subprocess (so its cpu and rss can be measured
+alone), then thousands of simulated parties subscribe to it through in-process
+`grpc.aio` clients, and proposals are replayed with a configurable arrival pattern.
+
+Reports:
+
+    1. proposal status counts
+    2. p50/p95/p99 latency from proposal submitted to task READY on chosen party
+    3. throughput of proposals and READY tasks
+    4. coordinator rss and cpu
+"""
+
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import List, MutableMapping
+
+import typer
+
+app = typer.Typer()
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _process_cpu_seconds(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime and stime, 14th and 15th fields of stat
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return float("nan")
+
+
+def _process_rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return float("nan")
+
+
+def _percentile(values: List[float], q: float):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def _arrival_intervals(pattern: str, rate: float, duration: float, burst_size: int):
+    """
+    yield seconds to wait before each proposal
+    """
+    elapsed = 0.0
+    while elapsed < duration:
+        if pattern == "constant":
+            interval = 1.0 / rate
+            yield interval
+        elif pattern == "poisson":
+            interval = random.expovariate(rate)
+            yield interval
+        elif pattern == "burst":
+            interval = burst_size / rate
+            yield interval
+            for _ in range(burst_size - 1):
+                yield 0.0
+        else:
+            raise ValueError(f"unknown pattern {pattern}")
+        elapsed += interval
+
+
+class _Stats(object):
+    def __init__(self):
+        self.submit_time: MutableMapping[str, float] = {}
+        self.ready_latencies: List[float] = []
+        self.fetch_status: MutableMapping[str, int] = {}
+        self.proposal_status: MutableMapping[str, int] = {}
+
+
+async def _run(
+    parties: int,
+    channels: int,
+    pattern: str,
+    rate: float,
+    duration: float,
+    burst_size: int,
+    worker_num: int,
+    proposal_wait_time: int,
+    payload_bytes: int,
+    accept_ratio: float,
+    batch: bool,
+    port: int,
+):
+    import grpc
+
+    from fedvision.framework.protobuf import coordinator_pb2, coordinator_pb2_grpc
+    from fedvision.framework.protobuf import job_pb2
+    from fedvision.framework.utils.blob import extract_blobs
+
+    job_type = "benchmark"
+    stats = _Stats()
+
+    coordinator = subprocess.Popen(
+        [sys.executable, "-m", "fedvision.framework.cli.coordinator", "--port", str(port)]
+    )
+    options = [
+        ("grpc.max_send_message_length", 512 * 1024 * 1024),
+        ("grpc.max_receive_message_length", 512 * 1024 * 1024),
+    ]
+    channel_pool = [
+        grpc.aio.insecure_channel(f"127.0.0.1:{port}", options=options)
+        for _ in range(channels)
+    ]
+    try:
+        for channel in channel_pool:
+            await asyncio.wait_for(channel.channel_ready(), timeout=30)
+        stubs = [coordinator_pb2_grpc.CoordinatorStub(c) for c in channel_pool]
+
+        async def _fetch(stub, party_id, proposal_id):
+            response = await stub.FetchTask(
+                coordinator_pb2.FetchTask.REQ(
+                    party_id=party_id, proposal_id=proposal_id, job_type=job_type
+                )
+            )
+            status = coordinator_pb2.FetchTask.Status.Name(response.status)
+            stats.fetch_status[status] = stats.fetch_status.get(status, 0) + 1
+            if response.status == coordinator_pb2.FetchTask.READY:
+                submit_time = stats.submit_time.get(response.task.job_id)
+                if submit_time is not None:
+                    stats.ready_latencies.append(time.perf_counter() - submit_time)
+
+        async def _party(i):
+            stub = stubs[i % len(stubs)]
+            party_id = f"party-{i}"
+            request = coordinator_pb2.Subscribe.REQ(
+                party_id=party_id, job_types=[job_type], batch=batch
+            )
+            heartbeat = asyncio.create_task(_heartbeat(stub, party_id))
+            try:
+                async for response in stub.Subscribe(request):
+                    proposal_ids = [p.proposal_id for p in response.proposals]
+                    if not proposal_ids:
+                        proposal_ids = [response.proposal_id]
+                    for proposal_id in proposal_ids:
+                        if random.random() < accept_ratio:
+                            asyncio.create_task(_fetch(stub, party_id, proposal_id))
+            except grpc.aio.AioRpcError:
+                pass
+            finally:
+                heartbeat.cancel()
+
+        async def _heartbeat(stub, party_id):
+            while True:
+                await asyncio.sleep(5)
+                await stub.Heartbeat(coordinator_pb2.Heartbeat.REQ(party_id=party_id))
+
+        party_tasks = [asyncio.create_task(_party(i)) for i in range(parties)]
+        # wait subscriptions settle
+        await asyncio.sleep(max(1.0, parties / 5000))
+
+        payload = os.urandom(payload_bytes)
+
+        async def _propose(index):
+            job_id = f"benchmark_job_{index}"
+            request = coordinator_pb2.Proposal.REQ(
+                job_id=job_id,
+                job_type=job_type,
+                proposal_wait_time=proposal_wait_time,
+                minimum_acceptance=worker_num,
+                maximum_acceptance=worker_num,
+            )
+            blobs = {}
+            for _ in range(worker_num):
+                task = request.tasks.add(job_id=job_id, task_type=job_type)
+                task.task.Pack(job_pb2.Blob(data=payload))
+                extract_blobs(task, blobs)
+            for digest, data in blobs.items():
+                request.blobs.add(digest=digest, data=data)
+            stats.submit_time[job_id] = time.perf_counter()
+            response = await stubs[index % len(stubs)].Proposal(request)
+            status = coordinator_pb2.Proposal.Status.Name(response.status)
+            stats.proposal_status[status] = stats.proposal_status.get(status, 0) + 1
+
+        cpu_start = _process_cpu_seconds(coordinator.pid)
+        start = time.perf_counter()
+        proposals = []
+        for index, interval in enumerate(
+            _arrival_intervals(pattern, rate, duration, burst_size)
+        ):
+            if interval > 0:
+                await asyncio.sleep(interval)
+            proposals.append(asyncio.create_task(_propose(index)))
+        await asyncio.gather(*proposals)
+        elapsed = time.perf_counter() - start
+        cpu = _process_cpu_seconds(coordinator.pid) - cpu_start
+        rss = _process_rss_bytes(coordinator.pid)
+
+        for task in party_tasks:
+            task.cancel()
+    finally:
+        for channel in channel_pool:
+            await channel.close()
+        coordinator.terminate()
+        coordinator.wait()
+
+    return stats, elapsed, cpu, rss
+
+
+@app.command()
+def run(
+    parties: int = typer.Option(1000, help="number of simulated parties"),
+    channels: int = typer.Option(16, help="grpc channels shared by parties"),
+    pattern: str = typer.Option("poisson", help="constant|poisson|burst"),
+    rate: float = typer.Option(10.0, help="proposals per second"),
+    duration: float = typer.Option(30.0, help="seconds to generate proposals"),
+    burst_size: int = typer.Option(20, help="proposals per burst"),
+    worker_num: int = typer.Option(2, help="acceptance required per proposal"),
+    proposal_wait_time: int = typer.Option(5, help="proposal open period seconds"),
+    payload_bytes: int = typer.Option(1024 * 1024, help="task payload size"),
+    accept_ratio: float = typer.Option(1.0, help="probability a party accepts"),
+    batch: bool = typer.Option(False, help="subscribe in batch mode"),
+    port: int = typer.Option(19090, help="coordinator port"),
+):
+    """
+    run coordinator load test
+    """
+    stats, elapsed, cpu, rss = asyncio.run(
+        _run(
+            parties=parties,
+            channels=channels,
+            pattern=pattern,
+            rate=rate,
+            duration=duration,
+            burst_size=burst_size,
+            worker_num=worker_num,
+            proposal_wait_time=proposal_wait_time,
+            payload_bytes=payload_bytes,
+            accept_ratio=accept_ratio,
+            batch=batch,
+            port=port,
+        )
+    )
+    num_proposals = sum(stats.proposal_status.values())
+    latencies = stats.ready_latencies
+    typer.echo(f"parties={parties} pattern={pattern} rate={rate}/s elapsed={elapsed:.1f}s")
+    typer.echo(f"proposal status: {stats.proposal_status}")
+    typer.echo(f"fetch status: {stats.fetch_status}")
+    typer.echo(
+        f"proposal-to-READY latency(s): "
+        f"p50={_percentile(latencies, 50):.3f} "
+        f"p95={_percentile(latencies, 95):.3f} "
+        f"p99={_percentile(latencies, 99):.3f}"
+    )
+    typer.echo(
+        f"throughput: proposals={num_proposals / elapsed:.2f}/s "
+        f"ready_tasks={len(latencies) / elapsed:.2f}/s"
+    )
+    typer.echo(
+        f"coordinator: cpu={cpu:.2f}s ({cpu / elapsed:.1%}) rss={rss / 1024 / 1024:.1f}MiB"
+    )
+
+
+if __name__ == "__main__":
+    app()
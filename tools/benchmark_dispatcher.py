@@ -0,0 +1,172 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+benchmark of cluster manager worker selection.
+
+Thousands of simulated workers with random task slots are loaded to a target
+utilization, then tasks are placed and random running tasks finished in steady
+state. Each dispatch policy is compared with `linear`, the first-fit scan over
+all workers used before the index.
+
+Reports per policy:
+
+    1. mean and p99 placement time
+    2. placements failed for lack of capacity
+    3. load balance: stddev of worker utilization, fully loaded and idle workers
+"""
+
+import random
+import statistics
+import time
+from typing import List
+
+import typer
+
+from fedvision.framework.cluster.dispatcher import POLICIES, WorkerIndex
+
+app = typer.Typer()
+
+
+class _SimWorker(object):
+    def __init__(self, worker_id, max_tasks):
+        self.worker_id = worker_id
+        self.max_tasks = max_tasks
+        self.num_task_remind = max_tasks
+
+
+class _LinearIndex(object):
+    """
+    first worker with free slots, scanning in enroll order
+    """
+
+    def __init__(self):
+        self._workers = {}
+
+    def add(self, worker):
+        self._workers[worker.worker_id] = worker
+
+    def update(self, worker):
+        pass
+
+    def select(self, predicate=None):
+        for worker in self._workers.values():
+            if worker.num_task_remind > 0:
+                return worker
+        return None
+
+
+def _percentile(values: List[float], q: float):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def _simulate(policy, workers, min_tasks, max_tasks, utilization, placements, seed):
+    rng = random.Random(seed)
+    index = _LinearIndex() if policy == "linear" else WorkerIndex(policy, seed=seed)
+    sim_workers = [
+        _SimWorker(f"worker-{i}", rng.randint(min_tasks, max_tasks))
+        for i in range(workers)
+    ]
+    for worker in sim_workers:
+        index.add(worker)
+    capacity = sum(worker.max_tasks for worker in sim_workers)
+
+    running: List[_SimWorker] = []
+    failed = 0
+    durations = []
+
+    def _place(record):
+        nonlocal failed
+        start = time.perf_counter_ns()
+        worker = index.select()
+        if worker is not None:
+            worker.num_task_remind -= 1
+            index.update(worker)
+        if record:
+            durations.append(time.perf_counter_ns() - start)
+        if worker is None:
+            failed += 1
+        else:
+            running.append(worker)
+
+    def _finish():
+        pos = rng.randrange(len(running))
+        running[pos], running[-1] = running[-1], running[pos]
+        worker = running.pop()
+        worker.num_task_remind += 1
+        index.update(worker)
+
+    while len(running) < capacity * utilization:
+        _place(record=False)
+
+    for _ in range(placements):
+        _place(record=True)
+        if running:
+            _finish()
+
+    loads = [
+        (worker.max_tasks - worker.num_task_remind) / worker.max_tasks
+        for worker in sim_workers
+    ]
+    return dict(
+        mean_us=statistics.mean(durations) / 1000,
+        p99_us=_percentile(durations, 99) / 1000,
+        failed=failed,
+        load_stddev=statistics.pstdev(loads),
+        full=sum(1 for load in loads if load >= 1),
+        idle=sum(1 for load in loads if load <= 0),
+    )
+
+
+@app.command()
+def run(
+    workers: int = typer.Option(5000, help="number of simulated workers"),
+    min_tasks: int = typer.Option(1, help="min task slots of a worker"),
+    max_tasks: int = typer.Option(16, help="max task slots of a worker"),
+    utilization: float = typer.Option(0.7, help="fraction of slots busy in steady state"),
+    placements: int = typer.Option(100000, help="placements measured"),
+    seed: int = typer.Option(0, help="random seed"),
+):
+    """
+    compare dispatch policies
+    """
+    typer.echo(
+        f"workers={workers} slots={min_tasks}..{max_tasks} "
+        f"utilization={utilization} placements={placements}"
+    )
+    for policy in ("linear", *POLICIES):
+        result = _simulate(
+            policy=policy,
+            workers=workers,
+            min_tasks=min_tasks,
+            max_tasks=max_tasks,
+            utilization=utilization,
+            placements=placements,
+            seed=seed,
+        )
+        typer.echo(
+            f"{policy:>12}: "
+            f"mean={result['mean_us']:.2f}us p99={result['p99_us']:.2f}us "
+            f"failed={result['failed']} "
+            f"load_stddev={result['load_stddev']:.3f} "
+            f"full={result['full']} idle={result['idle']}"
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,105 @@
+# Copyright (c) 2020 The FedVision Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+benchmark `Coordinator.Subscribe` with many idle subscribers.
+
+Subscribe streams are driven in-process (no network), so the numbers reflect
+the coordinator event loop only:
+
+    1. cpu time consumed while all subscribers are idle
+    2. latency from proposal dispatched to proposal delivered to every subscriber
+"""
+
+import asyncio
+import statistics
+import time
+
+import typer
+
+app = typer.Typer()
+
+
+async def _run(num_subscribers: int, idle_seconds: float, num_proposals: int):
+    from fedvision.framework.coordinator.coordinator import Coordinator
+    from fedvision.framework.protobuf import coordinator_pb2
+
+    coordinator = Coordinator(port=0)
+    job_type = "benchmark"
+    delivered = {}
+
+    async def _subscriber(party_id):
+        request = coordinator_pb2.Subscribe.REQ(party_id=party_id, job_types=[job_type])
+        async for response in coordinator.Subscribe(request, None):
+            delivered.setdefault(response.proposal_id, []).append(time.perf_counter())
+
+    subscribers = [
+        asyncio.create_task(_subscriber(f"party-{i}")) for i in range(num_subscribers)
+    ]
+    # let all subscribers enroll
+    while len(coordinator._enrolled) < num_subscribers:
+        await asyncio.sleep(0.01)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.sleep(idle_seconds)
+    idle_cpu = time.process_time() - cpu_start
+    idle_wall = time.perf_counter() - wall_start
+
+    latencies = []
+    for i in range(num_proposals):
+        request = coordinator_pb2.Proposal.REQ(
+            job_id=f"benchmark-{i}",
+            job_type=job_type,
+            proposal_wait_time=1,
+            minimum_acceptance=1,
+            maximum_acceptance=1,
+        )
+        start = time.perf_counter()
+        proposal_task = asyncio.create_task(coordinator.Proposal(request, None))
+        proposal_id = f"benchmark-{i}-coo_{i + 1}"
+        while len(delivered.get(proposal_id, [])) < num_subscribers:
+            await asyncio.sleep(0)
+        latencies.append(max(delivered[proposal_id]) - start)
+        await proposal_task
+
+    for party_id in list(coordinator._enrolled):
+        await coordinator.Leave(coordinator_pb2.Leave.REQ(party_id=party_id), None)
+    await asyncio.gather(*subscribers)
+
+    return idle_cpu, idle_wall, latencies
+
+
+@app.command()
+def run(
+    subscribers: str = typer.Option("1000,10000", help="comma separated counts"),
+    idle_seconds: float = typer.Option(10.0, help="seconds to stay idle"),
+    proposals: int = typer.Option(5, help="proposals to deliver per round"),
+):
+    """
+    run subscribe benchmark
+    """
+    for num in [int(n) for n in subscribers.split(",")]:
+        idle_cpu, idle_wall, latencies = asyncio.run(_run(num, idle_seconds, proposals))
+        typer.echo(
+            f"subscribers={num} "
+            f"idle_cpu={idle_cpu:.3f}s/{idle_wall:.1f}s ({idle_cpu / idle_wall:.1%}) "
+            f"delivery_latency_ms: "
+            f"mean={statistics.mean(latencies) * 1000:.2f} "
+            f"max={max(latencies) * 1000:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    app()